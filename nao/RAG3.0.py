@@ -1,18 +1,42 @@
+import time
+SCRIPT_START = time.perf_counter()
+
 from flask import Flask, request, jsonify
+import argparse
 import json
 import ollama
-import numpy as np
-import os
-import time
-import uuid
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from model_service import get_sbert_model
+from lazy_loading import LazyModel, StartupTimer
+from embedding_store import EmbeddingStore
+from conversation_store import create_conversation_store
+from context_window import ContextWindow, ollama_summarizer
+from retrieval import get_retrieval_engine
+from query_cache import QueryEmbeddingCache
+from micro_batcher import MicroBatchEncoder
+from response_cache import context_cache_key
+from embeddings import embed_sbert_batched, embed_ollama_batched, EMBED_BATCH_SIZE, OLLAMA_MAX_CONCURRENCY, QueryEmbedder
 
 app = Flask(__name__)
 app.secret_key = "123456789"
 
 # Initialize SBERT model for embedding
-sbert_model = SentenceTransformer('all-MiniLM-L6-v2')  # Lightweight SBERT model; can change as needed
+SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'  # Lightweight SBERT model; can change as needed
+# Shared with the other scripts when model_service.py runs; loaded on first use, or in the background with --warmup
+sbert_model = LazyModel("SBERT", lambda: get_sbert_model(SBERT_MODEL_NAME))
+
+# Vector index used for retrieval: 'brute' (exact), or 'ivf' / 'hnsw' (approximate) for large datasets
+INDEX_BACKEND = 'brute'
+
+# Cache of query embeddings (LRU, entries expire after one day, saved to disk on exit in a file of its own)
+query_embedding_cache = QueryEmbeddingCache(max_entries=1024, ttl=24 * 3600, persist_path="rag_query_embedding_cache.json")
+
+# Concurrent queries are encoded by SBERT together, batches of up to 16 queries arriving within 5 ms
+query_sbert_encoder = MicroBatchEncoder(sbert_model, max_batch_size=16, max_wait_ms=5)
+query_embedder = QueryEmbedder(query_sbert_encoder, SBERT_MODEL_NAME, cache=query_embedding_cache)
+
+# Optional semantic answer cache for near-duplicate questions, disabled by default
+# (enable with response_cache.SemanticResponseCache(threshold=0.92, max_entries=256, ttl=3600))
+response_cache = None
 
 # Define Nao's personality and conversation template
 template = """
@@ -26,76 +50,69 @@ Answer:
 
 # Define the context directory to store chat history
 CONTEXT_DIR = "contexts"
-if not os.path.exists(CONTEXT_DIR):
-    os.makedirs(CONTEXT_DIR)
 
-last_message_time = time.time()
-current_context_file = f"{CONTEXT_DIR}/{str(uuid.uuid4())}.txt"
+# Conversations are kept per session ('memory' appends to text files in CONTEXT_DIR, 'sqlite' uses a database)
+# A conversation ends after 1 minute of inactivity
+CONVERSATION_BACKEND = "memory"
+conversation_store = create_conversation_store(CONVERSATION_BACKEND, context_dir=CONTEXT_DIR, idle_timeout=60)
+
+# Token budget for the conversation history in the prompt, older turns are folded into a rolling summary
+context_window = ContextWindow(max_tokens=768, summarize_fn=ollama_summarizer('llama3.2'))
 
 # Load and preprocess dataset using SBERT and Ollama for embeddings (only instructions)
-def load_and_preprocess_data(dataset_path, model_name='llama3.2'):
+# Embeddings are cached on disk, so only new or changed instructions are embedded on restart,
+# and those are embedded in batches (batch_size texts per SBERT pass / Ollama request)
+def load_and_preprocess_data(dataset_path, model_name='llama3.2', batch_size=EMBED_BATCH_SIZE,
+                             max_concurrency=OLLAMA_MAX_CONCURRENCY):
     with open(dataset_path) as f:
         data = json.load(f)
+    instructions = [item["instruction"] for item in data]
 
-    preprocessed_data = []
-    for item in data:
-        instruction = item["instruction"]
-        output = item["output"]
-        
-        # Use SBERT for embedding
-        sbert_embedding = sbert_model.encode(instruction)
+    # Use SBERT for embedding
+    sbert_store = EmbeddingStore(SBERT_MODEL_NAME, dataset_path=dataset_path)
+    sbert_embeddings = sbert_store.embed(
+        instructions,
+        lambda texts: embed_sbert_batched(sbert_model, texts, batch_size=batch_size)
+    )
 
-        # Optionally use Ollama for embedding as well
-        embedding_response = ollama.embed(model=model_name, input=instruction)
-        ollama_embedding = embedding_response.get('embeddings', [None])[0]
+    # Optionally use Ollama for embedding as well
+    ollama_store = EmbeddingStore(model_name, dataset_path=dataset_path)
+    ollama_embeddings = ollama_store.embed(
+        instructions,
+        lambda texts: embed_ollama_batched(texts, model_name=model_name, batch_size=batch_size,
+                                           max_concurrency=max_concurrency)
+    )
 
+    preprocessed_data = []
+    for item, sbert_embedding, ollama_embedding in zip(data, sbert_embeddings, ollama_embeddings):
         preprocessed_data.append({
-            'instruction': instruction,
-            'output': output,
+            'instruction': item["instruction"],
+            'output': item["output"],
             'sbert_embedding': sbert_embedding,
             'ollama_embedding': ollama_embedding
         })
-    return preprocessed_data
 
-# Function to compute combined similarity
-def combined_similarity(query_embedding, data_embedding, ollama_weight=0.5, sbert_weight=0.5):
-    sbert_similarity = cosine_similarity([query_embedding['sbert']], [data_embedding['sbert']])[0][0]
-    ollama_similarity = cosine_similarity([query_embedding['ollama']], [data_embedding['ollama']])[0][0] if data_embedding['ollama'] is not None else 0
-    return ollama_weight * ollama_similarity + sbert_weight * sbert_similarity
+    # Cached answers may be based on the old dataset
+    if response_cache is not None:
+        response_cache.invalidate()
+    return preprocessed_data
 
-# Embed query using both SBERT and Ollama
+# Embed query using both SBERT and Ollama, running the two models concurrently
+# Repeated questions are served from the query embedding cache without running either model
 def embed_query(query, ollama_model_name='llama3.2'):
-    sbert_query_embedding = sbert_model.encode(query)
-    ollama_query_embedding = ollama.embed(model=ollama_model_name, input=query).get('embeddings', [None])[0]
-    return {
-        'sbert': sbert_query_embedding,
-        'ollama': ollama_query_embedding
-    }
+    return query_embedder.embed(query, ollama_model_name)
 
-# Retrieve top K documents using SBERT and Ollama integration
-def retrieve_top_k(query, preprocessed_data, model_name='llama3.2', k=3):
-    query_embedding = embed_query(query, ollama_model_name=model_name)
-    similarities = [
-        combined_similarity(query_embedding, {
-            'sbert': item['sbert_embedding'],
-            'ollama': item['ollama_embedding']
-        }) for item in preprocessed_data
-    ]
-    
-    top_k_indices = np.argsort(similarities)[-k:]
-    top_k_documents = [preprocessed_data[i] for i in top_k_indices]
-
-    # Optional re-ranking step
-    re_ranked_documents = sorted(
-        top_k_documents,
-        key=lambda doc: combined_similarity(query_embedding, {
-            'sbert': doc['sbert_embedding'],
-            'ollama': doc['ollama_embedding']
-        }),
-        reverse=True
-    )
+# Start embedding a query in the background (e.g. while the transcript is still being handled)
+# Returns a Future; a later embed_query call for the same query waits for it instead of re-embedding
+def start_embed_query(query, ollama_model_name='llama3.2'):
+    return query_embedder.submit(query, ollama_model_name)
 
-    return re_ranked_documents, max(similarities)
+# Retrieve top K documents using SBERT and Ollama integration
+# The engine scores all documents at once with the combined (0.5 SBERT + 0.5 Ollama) cosine similarity
+def retrieve_top_k(query, preprocessed_data, model_name='llama3.2', k=3, query_embedding=None):
+    if query_embedding is None:
+        query_embedding = embed_query(query, ollama_model_name=model_name)
+    return get_retrieval_engine(preprocessed_data, index_backend=INDEX_BACKEND).top_k(query_embedding, k=k)
 
 def generate_response(query, top_k_documents, context):
     # Ensure that doc['output'] is a string (if it's a list, join the elements)
@@ -119,65 +136,97 @@ def generate_response(query, top_k_documents, context):
 
 
 # Main Dynamic RAG function
+# Near-duplicate questions grounded on the same documents and conversation reuse the cached answer
 def dynamic_rag(query, preprocessed_data, context, model_name='llama3.2', top_k=3):
-    top_k_documents, max_similarity = retrieve_top_k(query, preprocessed_data, model_name=model_name, k=top_k)
-    response = generate_response(query, top_k_documents, context)
-    return response
-
-# Load and save context from/to files
-def load_context(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as file:
-            return file.read()
-    return ""
+    query_embedding = embed_query(query, ollama_model_name=model_name)
+    top_k_documents, max_similarity = retrieve_top_k(query, preprocessed_data, model_name=model_name, k=top_k,
+                                                     query_embedding=query_embedding)
 
-def save_context(context, file_path):
-    with open(file_path, "w") as file:
-        file.write(context)
+    context_key = context_cache_key(top_k_documents, context)
+    if response_cache is not None:
+        cached_response = response_cache.get(query_embedding['sbert'], context_key)
+        if cached_response is not None:
+            return cached_response
 
-# Dynamically generate a new context file
-def new_context_file():
-    return f"{CONTEXT_DIR}/{str(uuid.uuid4())}.txt"
+    response = generate_response(query, top_k_documents, context)
+    if response_cache is not None:
+        response_cache.put(query_embedding['sbert'], context_key, response)
+    return response
 
 # Flask route for the chat interface
+# Each robot or kiosk sends its own session_id (in the JSON body or the X-Session-ID header),
+# otherwise the client address is used, so concurrent users do not share a conversation
 @app.route('/chat', methods=['POST'])
 def chat():
-    global last_message_time, current_context_file
     data = request.json
     user_input = data.get('message')
 
     if user_input is None:
         return jsonify({"error": "No message provided"}), 400
 
-    # Check for inactivity of 1 minute
-    if time.time() - last_message_time > 60:
-        current_context_file = new_context_file()
+    session_id = str(data.get('session_id') or request.headers.get('X-Session-ID') or request.remote_addr)
 
-    # Load previous context
-    context = load_context(current_context_file)
+    # Load previous context (a new conversation starts after 1 minute of inactivity)
+    # Only the newest turns that fit the token budget are kept, older ones are summarized
+    conversation_id, turns = conversation_store.get_conversation(session_id)
+    context = context_window.build(turns, key=conversation_id)
 
     # If user ends the conversation
     if "goodbye" in user_input.lower() or user_input.lower() in ["exit", "bye", "quit"]:
         response_text = "Nao: Goodbye! Have a great day!"
-        save_context(context, current_context_file)  # Save current context
-        current_context_file = new_context_file()  # Start a new context
+        conversation_store.end(session_id)  # Start a new context
+        context_window.forget(conversation_id)
         return jsonify({"Nao": response_text})
 
     # Perform RAG for generating a response
     response = dynamic_rag(user_input, preprocessed_data, context, model_name='llama3.2', top_k=3)
 
     # Update context
-    context += f"\nUser: {user_input}\nNao: {response}"
-    save_context(context, current_context_file)
-
-    # Update last message time
-    last_message_time = time.time()
+    conversation_store.append(session_id, user_input, response)
 
     return jsonify({"response": response})
 
+# Flask route for the cache and latency statistics
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "query_embedding_timings": query_embedder.timings.stats(),
+        "sbert_micro_batching": query_sbert_encoder.stats(),
+        "conversations": conversation_store.stats(),
+        "context_window": context_window.stats(),
+        "response_cache": response_cache.stats() if response_cache is not None else None
+    })
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG chat server for Nao")
+    parser.add_argument('--async-server', action='store_true',
+                        help="serve with aiohttp: non-blocking Ollama calls, concurrency limit and 429 when busy")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--max-concurrency', type=int, default=8, help="chats processed at the same time")
+    parser.add_argument('--max-queue', type=int, default=32, help="chats waiting for a slot before 429 is returned")
+    parser.add_argument('--queue-timeout', type=float, default=10, help="seconds a chat may wait for a slot")
+    parser.add_argument('--warmup', action='store_true',
+                        help="load SBERT in a background thread at startup instead of on the first request")
+    args = parser.parse_args()
+    startup = StartupTimer(SCRIPT_START)
+    if args.warmup:
+        sbert_model.warmup()
+
     # Path to your dataset JSON
     dataset_path = r'C:\Users\User\Desktop\chatbot_test\fineTune\scripts\datasets.json'
     preprocessed_data = load_and_preprocess_data(dataset_path, model_name='llama3.2')
-    
-    app.run(debug=True, host='0.0.0.0')
+    startup.mark("dataset loaded")
+    startup.ready("RAG server")
+
+    if args.async_server:
+        from async_server import AsyncRAGServer, run_async_server
+        server = AsyncRAGServer(
+            preprocessed_data, query_sbert_encoder, SBERT_MODEL_NAME, template, conversation_store, context_window,
+            query_embedding_cache=query_embedding_cache, response_cache=response_cache, model_name='llama3.2',
+            index_backend=INDEX_BACKEND, max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+            queue_timeout=args.queue_timeout
+        )
+        run_async_server(server, host='0.0.0.0', port=args.port)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=args.port)
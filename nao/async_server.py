@@ -0,0 +1,193 @@
+"""
+This module is used to serve the RAG chat API asynchronously with aiohttp.
+
+Compared to the Flask server, a request never holds a thread while it waits for Ollama:
+Ollama is called through ollama.AsyncClient (one pooled HTTP client for all requests), and
+the CPU-bound work (SBERT encoding, retrieval) runs on a small worker pool. At most
+max_concurrency chats run at once; up to max_queue more wait for a slot (at most
+queue_timeout seconds), and any further request gets 429 Too Many Requests.
+
+It serves the same routes as RAG3.0.py: POST /chat and GET /stats.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+import ollama
+from retrieval import get_retrieval_engine
+from timings import StageTimings
+from response_cache import context_cache_key
+
+SYSTEM_MESSAGE = 'You are Nao, a friendly chatbot from Universiti Brunei Darussalam.'
+
+
+# Function to build the prompt from the retrieved documents and the conversation context
+def build_prompt(template, query, top_k_documents, context):
+    doc_context = " ".join([
+        " ".join([str(part) for part in doc['output']]) if isinstance(doc['output'], list) else str(doc['output'])
+        for doc in top_k_documents[:3]
+    ])
+    return template.format(context=context + "\n" + doc_context, question=query)
+
+
+class AsyncRAGServer:
+    """Async /chat server with a concurrency limit, a bounded wait queue and 429 when saturated."""
+
+    def __init__(self, preprocessed_data, sbert_model, sbert_model_name, template, conversation_store,
+                 context_window, query_embedding_cache=None, response_cache=None, model_name='llama3.2',
+                 index_backend='brute', top_k=3, max_concurrency=8, max_queue=32, queue_timeout=10,
+                 cpu_workers=2, ollama_host=None):
+        self.preprocessed_data = preprocessed_data
+        self.sbert_model = sbert_model
+        self.sbert_model_name = sbert_model_name
+        self.template = template
+        self.conversation_store = conversation_store
+        self.context_window = context_window
+        self.query_embedding_cache = query_embedding_cache
+        self.response_cache = response_cache
+        self.model_name = model_name
+        self.index_backend = index_backend
+        self.top_k = top_k
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="rag-cpu")
+        self.ollama_host = ollama_host
+        self.client = None
+        self.slots = None
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.timings = StageTimings()
+
+    async def on_startup(self, app):
+        # Created inside the event loop that serves the requests
+        self.client = ollama.AsyncClient(host=self.ollama_host)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def run_cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_pool, fn, *args)
+
+    async def embed_query(self, query):
+        cache_model_name = f"{self.sbert_model_name}+{self.model_name}"
+        if self.query_embedding_cache is not None:
+            cached_embedding = self.query_embedding_cache.get(query, cache_model_name)
+            if cached_embedding is not None:
+                return cached_embedding
+        # SBERT on the worker pool (or the micro-batcher) and the Ollama request on the event loop, at the same time
+        if hasattr(self.sbert_model, 'submit'):
+            sbert_task = asyncio.wrap_future(self.sbert_model.submit(query))
+        else:
+            sbert_task = self.run_cpu(self.sbert_model.encode, query)
+        sbert_embedding, ollama_response = await asyncio.gather(
+            sbert_task,
+            self.client.embed(model=self.model_name, input=query)
+        )
+        query_embedding = {'sbert': sbert_embedding, 'ollama': ollama_response.get('embeddings', [None])[0]}
+        if self.query_embedding_cache is not None:
+            self.query_embedding_cache.put(query, cache_model_name, query_embedding)
+        return query_embedding
+
+    async def dynamic_rag(self, query, context):
+        start_time = time.perf_counter()
+        query_embedding = await self.embed_query(query)
+        engine = get_retrieval_engine(self.preprocessed_data, index_backend=self.index_backend)
+        top_k_documents, max_similarity = await self.run_cpu(engine.top_k, query_embedding, self.top_k)
+        self.timings.record('retrieval', time.perf_counter() - start_time)
+
+        context_key = context_cache_key(top_k_documents, context)
+        if self.response_cache is not None:
+            cached_response = self.response_cache.get(query_embedding['sbert'], context_key)
+            if cached_response is not None:
+                return cached_response
+
+        start_time = time.perf_counter()
+        response = await self.client.chat(
+            model=self.model_name,
+            messages=[
+                {'role': 'system', 'content': SYSTEM_MESSAGE},
+                {'role': 'user', 'content': build_prompt(self.template, query, top_k_documents, context)}
+            ]
+        )
+        self.timings.record('generation', time.perf_counter() - start_time)
+        response = response['message']['content']
+        if self.response_cache is not None:
+            self.response_cache.put(query_embedding['sbert'], context_key, response)
+        return response
+
+    async def acquire_slot(self):
+        """Wait for a free slot; False when the queue is full or the wait times out."""
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    async def chat(self, request):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = {}
+        user_input = data.get('message')
+        if user_input is None:
+            return web.json_response({"error": "No message provided"}, status=400)
+
+        if not await self.acquire_slot():
+            self.rejected += 1
+            return web.json_response({"error": "Server busy, try again later"}, status=429,
+                                     headers={"Retry-After": "1"})
+        self.running += 1
+        start_time = time.perf_counter()
+        try:
+            session_id = str(data.get('session_id') or request.headers.get('X-Session-ID') or request.remote)
+            loop = asyncio.get_running_loop()
+            conversation_id, turns = await loop.run_in_executor(None, self.conversation_store.get_conversation, session_id)
+            context = self.context_window.build(turns, key=conversation_id)
+
+            if "goodbye" in user_input.lower() or user_input.lower() in ["exit", "bye", "quit"]:
+                await loop.run_in_executor(None, self.conversation_store.end, session_id)
+                self.context_window.forget(conversation_id)
+                return web.json_response({"Nao": "Nao: Goodbye! Have a great day!"})
+
+            response = await self.dynamic_rag(user_input, context)
+            await loop.run_in_executor(None, self.conversation_store.append, session_id, user_input, response)
+            return web.json_response({"response": response})
+        finally:
+            self.running -= 1
+            self.slots.release()
+            self.timings.record('chat', time.perf_counter() - start_time)
+
+    async def stats(self, request):
+        return web.json_response({
+            "server": {
+                'running': self.running,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue
+            },
+            "timings": self.timings.stats(),
+            "sbert_micro_batching": self.sbert_model.stats() if hasattr(self.sbert_model, 'submit') else None,
+            "query_embedding_cache": self.query_embedding_cache.stats() if self.query_embedding_cache else None,
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "conversations": self.conversation_store.stats(),
+            "context_window": self.context_window.stats()
+        })
+
+    def create_app(self):
+        app = web.Application()
+        app.on_startup.append(self.on_startup)
+        app.router.add_post('/chat', self.chat)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+# Function to run the async server (blocks until stopped)
+def run_async_server(server, host='0.0.0.0', port=5000):
+    web.run_app(server.create_app(), host=host, port=port)
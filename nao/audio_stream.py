@@ -0,0 +1,61 @@
+"""
+This module is used to send speech to NAO straight from memory, without files or SFTP.
+
+The TTS mp3 is written into a buffer, decoded to 16-bit stereo PCM at the robot's output sample
+rate, and posted to the /stream_audio route of nao_talk.py with chunked transfer encoding.
+nao_talk.py hands every chunk to ALAudioDevice as soon as it arrives, so NAO starts playing
+before the whole clip has been sent.
+"""
+
+import io
+import requests
+
+STREAM_AUDIO_URL = 'http://localhost:5004/stream_audio'
+STREAM_SAMPLE_RATE = 22050  # One of the ALAudioDevice output rates: 16000, 22050, 44100, 48000
+STREAM_CHUNK_FRAMES = 4096  # ALAudioDevice takes at most 16384 frames per buffer
+FRAME_BYTES = 4  # 16-bit stereo
+
+
+# Function to synthesize speech with gTTS into an in-memory mp3
+def gtts_to_mp3_bytes(text, lang='ms'):
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+# Function to decode audio bytes (mp3, wav, ...) to the raw PCM that ALAudioDevice plays
+def decode_to_pcm(audio_bytes, sample_rate=STREAM_SAMPLE_RATE, format=None):
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(io.BytesIO(audio_bytes), format=format)
+    segment = segment.set_frame_rate(sample_rate).set_channels(2).set_sample_width(2)
+    return segment.raw_data
+
+
+# Function to split PCM into chunks of whole frames
+def pcm_chunks(pcm, chunk_frames=STREAM_CHUNK_FRAMES):
+    chunk_bytes = chunk_frames * FRAME_BYTES
+    for start in range(0, len(pcm), chunk_bytes):
+        yield pcm[start:start + chunk_bytes]
+
+
+# Function to stream PCM chunks to nao_talk.py, which plays them while the rest is still arriving
+def stream_pcm_to_nao(chunks, sample_rate=STREAM_SAMPLE_RATE, url=STREAM_AUDIO_URL):
+    # A generator body makes requests send it with chunked transfer encoding
+    response = requests.post(url, data=iter(chunks), timeout=(5, 120), headers={
+        'Content-Type': 'application/octet-stream',
+        'X-Sample-Rate': str(sample_rate)
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+# Function to play an audio clip (mp3, wav, ...) on NAO through the in-memory path
+def play_on_nao(audio_bytes, format=None, sample_rate=STREAM_SAMPLE_RATE, url=STREAM_AUDIO_URL):
+    pcm = decode_to_pcm(audio_bytes, sample_rate, format=format)
+    return stream_pcm_to_nao(pcm_chunks(pcm), sample_rate, url)
+
+
+# Function to speak text on NAO through the in-memory path
+def speak_on_nao(text, lang='ms', sample_rate=STREAM_SAMPLE_RATE, url=STREAM_AUDIO_URL):
+    return play_on_nao(gtts_to_mp3_bytes(text, lang), 'mp3', sample_rate, url)
@@ -0,0 +1,179 @@
+"""
+This module is used to look up NAO behaviors from the mapping files without re-reading them.
+
+The mapping file has one behavior per line, "behavior_name: keyword, another keyword", with
+'#' comment lines. All keywords are compiled into one regular expression with word boundaries,
+so one pass over the text finds every keyword. When several behaviors match, the one listed
+first in the file wins (for the same behavior, the longest keyword).
+
+The emotion mapping file has one "behavior_name: emotion" per line and is indexed by emotion.
+
+MappingFile keeps the parsed file and rebuilds it when the file's mtime changes; the new
+matcher is built completely before it replaces the old one, so a match never sees half a file.
+MappingRegistry holds both files and warns about mapped behaviors that are not installed on NAO.
+"""
+
+import os
+import re
+import threading
+import time
+import requests
+
+
+# Function to parse a mapping file into a list of (name, [keywords]) in file order
+def parse_mapping_file(file_path):
+    mapping = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ':' not in line:
+                print(f"Skipping line {line_number} of {file_path}, expected 'name: keywords': {line}")
+                continue
+            name, keywords = line.rsplit(':', 1)
+            keywords = [keyword.strip().lower() for keyword in keywords.split(',') if keyword.strip()]
+            mapping.append((name.strip(), keywords))
+    return mapping
+
+
+class KeywordMatcher:
+    """All keywords of a mapping compiled into one word-boundary regex."""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.keywords = {}  # keyword -> (priority, behavior), the first behavior listed keeps a shared keyword
+        for priority, (behavior, keywords) in enumerate(mapping):
+            for keyword in keywords:
+                self.keywords.setdefault(keyword, (priority, behavior))
+        if self.keywords:
+            # Longest first, so "thumbs up" is tried before "up"; spaces match any whitespace
+            alternatives = sorted(self.keywords, key=len, reverse=True)
+            pattern = "|".join(r"\s+".join(map(re.escape, keyword.split())) for keyword in alternatives)
+            self.pattern = re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def match(self, text):
+        """Return the behavior with the highest priority whose keyword appears in the text, or None."""
+        if self.pattern is None or not text:
+            return None
+        best = None
+        for found in self.pattern.finditer(text):
+            keyword = " ".join(found.group(0).lower().split())
+            priority, behavior = self.keywords[keyword]
+            rank = (priority, -len(keyword))
+            if best is None or rank < best[0]:
+                best = (rank, behavior)
+                if priority == 0:
+                    break  # Nothing can beat the first behavior in the file
+        return best[1] if best else None
+
+
+class MappingFile:
+    """A mapping file parsed by build(mapping), rebuilt when the file changes on disk."""
+
+    def __init__(self, file_path, build=KeywordMatcher, check_interval=1.0):
+        self.file_path = file_path
+        self.build = build
+        self.check_interval = check_interval  # Seconds between mtime checks
+        self.mtime = None
+        self.value = build([])
+        self.checked_at = 0.0
+        self.reloads = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Return the built mapping, reloading it first if the file has changed."""
+        now = time.monotonic()
+        if now - self.checked_at >= self.check_interval:
+            with self.lock:
+                if now - self.checked_at >= self.check_interval:
+                    self.reload_if_changed()
+                    self.checked_at = now
+        return self.value
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            if self.mtime is not False:
+                print(f"Mapping file {self.file_path} not found")
+            self.mtime = False
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            value = self.build(parse_mapping_file(self.file_path))
+        except (OSError, ValueError, re.error) as e:
+            print(f"Could not load {self.file_path}, keeping the previous mapping: {e}")
+            return
+        self.value = value  # Swapped in one assignment, readers see the old or the new mapping
+        self.mtime = mtime
+        self.reloads += 1
+        print(f"Loaded {self.file_path}")
+
+
+class EmotionMapping:
+    """Emotion label -> behavior, from the "behavior_name: emotion" lines of the emotion mapping."""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.actions = {}
+        for behavior, emotions in mapping:
+            for emotion in emotions:
+                self.actions.setdefault(emotion, behavior)
+
+    def match(self, emotion_label):
+        """Return the behavior for the emotion label, or None."""
+        return self.actions.get(emotion_label.lower()) if emotion_label else None
+
+
+# Function to get the behaviors installed on NAO from the nao_talk.py server, None when it is not reachable
+def fetch_installed_behaviors(url='http://localhost:5004/behaviors'):
+    try:
+        response = requests.get(url, timeout=5)
+        response.raise_for_status()
+        return set(response.json()["behaviors"])
+    except Exception as e:
+        print(f"Could not get the installed behaviors from NAO: {e}")
+        return None
+
+
+class MappingRegistry:
+    """The command and emotion mappings, reloaded when their files change and checked against NAO."""
+
+    def __init__(self, command_path="command_mapping.txt", emotion_path="emotion_mapping.txt",
+                 installed_behaviors_fn=fetch_installed_behaviors, check_interval=1.0):
+        self.commands = MappingFile(command_path, KeywordMatcher, check_interval)
+        self.emotions = MappingFile(emotion_path, EmotionMapping, check_interval)
+        self.installed_behaviors_fn = installed_behaviors_fn
+        self.installed_behaviors = None
+        self.validated = {}  # MappingFile -> number of reloads that were validated
+
+    def load(self):
+        """Load both files and get the installed behaviors from NAO to validate them against."""
+        if self.installed_behaviors_fn is not None:
+            self.installed_behaviors = self.installed_behaviors_fn()
+        self.get(self.commands)
+        self.get(self.emotions)
+
+    def find_behavior(self, text):
+        return self.get(self.commands).match(text)
+
+    def find_emotion_action(self, emotion_label):
+        return self.get(self.emotions).match(emotion_label)
+
+    def get(self, mapping_file):
+        value = mapping_file.get()
+        if self.installed_behaviors is not None and self.validated.get(mapping_file) != mapping_file.reloads:
+            self.validated[mapping_file] = mapping_file.reloads
+            self.validate(mapping_file.file_path, value.mapping)
+        return value
+
+    def validate(self, file_path, mapping):
+        """Warn about the mapped behaviors that are not installed on NAO, returns their names."""
+        missing = [behavior for behavior, _ in mapping if behavior not in self.installed_behaviors]
+        for behavior in missing:
+            print(f"{file_path}: behavior '{behavior}' is not installed on NAO")
+        return missing
@@ -0,0 +1,74 @@
+"""
+This script is used to benchmark the emotion classifier backends against the current pipeline.
+
+For each backend it reports the load time, the mean latency of classifying one reply (the way
+pc_sr.py does after every reply), the throughput of batched classification, and how often its
+label agrees with the 'pipeline' backend. Pass --texts with one reply per line to use real
+replies instead of the built-in examples.
+
+Example:
+    python benchmark_emotion.py --backends pipeline int8 onnx
+    python benchmark_emotion.py --texts replies.txt --repeat 3
+"""
+
+import argparse
+import time
+from emotion import EMOTION_BACKENDS, EMOTION_MODEL_NAME, load_emotion_pipeline
+
+SAMPLE_REPLIES = [
+    "Hello! It's great to meet you, welcome to Universiti Brunei Darussalam.",
+    "I'm sorry to hear that, I hope you feel better soon.",
+    "The School of Digital Science offers programmes in computer science and data science.",
+    "Wow, I did not expect that at all!",
+    "That is really annoying, I understand why you are upset.",
+    "I am scared of falling down the stairs.",
+    "The library opens at eight in the morning.",
+    "Congratulations on your graduation, that is wonderful news!",
+    "Saya gembira dapat membantu anda hari ini.",
+    "Maaf, saya tidak tahu jawapannya.",
+]
+
+
+# Function to time single-reply and batched classification, returns (labels, single ms, texts per second)
+def evaluate(classifier, texts, repeat, batch_size):
+    classifier(texts[0])  # The first call initializes the backend, it is not counted
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        labels = [classifier(text)[0]['label'] for text in texts]
+    single_ms = (time.perf_counter() - start_time) * 1000 / (repeat * len(texts))
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        classifier(texts, batch_size=batch_size, truncation=True)
+    throughput = repeat * len(texts) / (time.perf_counter() - start_time)
+    return labels, single_ms, throughput
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and label agreement of the emotion classifier backends")
+    parser.add_argument("--model", default=EMOTION_MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", default=list(EMOTION_BACKENDS), choices=EMOTION_BACKENDS)
+    parser.add_argument("--texts", help="file with one reply per line")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_REPLIES
+
+    # The current pipeline is the reference for the label agreement
+    backends = ['pipeline'] + [backend for backend in args.backends if backend != 'pipeline']
+    reference = None
+    print(f"{'backend':>10} {'load s':>8} {'single ms':>10} {'batch/s':>9} {'agreement':>10}")
+    for backend in backends:
+        start_time = time.perf_counter()
+        classifier = load_emotion_pipeline(args.model, backend)
+        load_seconds = time.perf_counter() - start_time
+        labels, single_ms, throughput = evaluate(classifier, texts, args.repeat, args.batch_size)
+        if reference is None:
+            reference = labels
+        agreement = sum(a == b for a, b in zip(labels, reference)) / len(texts)
+        print(f"{backend:>10} {load_seconds:>8.1f} {single_ms:>10.1f} {throughput:>9.1f} {agreement:>10.1%}")
@@ -0,0 +1,98 @@
+"""
+This script is used to benchmark the approximate vector indexes against the exact one.
+
+It reports recall@k (how many of the exact top K the index also returns) and the mean
+search latency for several nprobe (IVF) and ef (HNSW) settings. By default it uses random
+clustered vectors; pass --store to benchmark the embeddings saved by embedding_store.py.
+Store files are named <model>-<dataset path hash>.json, pick the one of your dataset in
+embedding_store/ (the most recently written one after a run of RAG3.0.py or pc_sr.py).
+
+Example:
+    python benchmark_index.py --rows 200000 --dim 384 --queries 200
+    python benchmark_index.py --store embedding_store/all-MiniLM-L6-v2-1a2b3c4d5e6f.json
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from vector_index import create_index
+
+
+# Function to generate unit vectors grouped around random centers, like real text embeddings
+def clustered_vectors(rows, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# Function to load the matrix of an embedding store from its metadata file
+def load_store(meta_path):
+    with open(meta_path) as f:
+        meta = json.load(f)
+    matrix_path = meta_path[:-len(".json")] + ".f32"
+    matrix = np.fromfile(matrix_path, dtype=np.float32).reshape(len(meta["keys"]), meta["dim"])
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+# Function to time the searches of an index and compute its recall against the exact results
+def evaluate(index, queries, exact_ids, k):
+    hits = 0
+    start_time = time.perf_counter()
+    results = [index.search(query, k)[0] for query in queries]
+    latency_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+    for ids, truth in zip(results, exact_ids):
+        hits += len(set(ids.tolist()) & set(truth.tolist()))
+    return hits / (len(queries) * k), latency_ms
+
+
+# Function to build an index, printing the build time
+def build(backend, vectors, **options):
+    start_time = time.perf_counter()
+    index = create_index(backend, vectors.shape[1], **options)
+    index.add(vectors)
+    print(f"Built {backend} {options} in {time.perf_counter() - start_time:.1f}s")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of the vector index backends")
+    parser.add_argument("--store", help="embedding store metadata (.json) to use instead of random vectors")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--lists", type=int, default=256, help="number of IVF lists")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = load_store(args.store)
+    else:
+        vectors = clustered_vectors(args.rows, args.dim, clusters=args.lists)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed dataset rows, so they have near neighbours like real questions
+    queries = vectors[rng.integers(len(vectors), size=args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    print(f"{len(vectors)} vectors of dim {vectors.shape[1]}, {args.queries} queries, k={args.k}\n")
+
+    exact = build('brute', vectors)
+    exact_ids = [exact.search(query, args.k)[0] for query in queries]
+    recall, latency_ms = evaluate(exact, queries, exact_ids, args.k)
+    print(f"{'brute':<24} recall@{args.k}={recall:.3f}  latency={latency_ms:.3f} ms")
+
+    ivf = build('ivf', vectors, n_lists=args.lists)
+    for nprobe in [1, 2, 4, 8, 16, 32, 64]:
+        ivf.nprobe = nprobe
+        recall, latency_ms = evaluate(ivf, queries, exact_ids, args.k)
+        print(f"{f'ivf nprobe={nprobe}':<24} recall@{args.k}={recall:.3f}  latency={latency_ms:.3f} ms")
+
+    try:
+        hnsw = build('hnsw', vectors, capacity=len(vectors))
+    except ImportError as e:
+        print(f"Skipping HNSW: {e}")
+    else:
+        for ef in [16, 32, 64, 128, 256]:
+            hnsw.ef = ef
+            recall, latency_ms = evaluate(hnsw, queries, exact_ids, args.k)
+            print(f"{f'hnsw ef={ef}':<24} recall@{args.k}={recall:.3f}  latency={latency_ms:.3f} ms")
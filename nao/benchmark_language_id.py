@@ -0,0 +1,100 @@
+"""
+This script is used to benchmark the language routing against the parallel dual recognition.
+
+It runs both on recorded clips and reports, for each, the language accuracy, the mean latency
+per utterance and the number of recognition requests per utterance. The clips are WAV files
+named with their language first (ms_*.wav or en_*.wav), or listed in a CSV file of
+"path,language" lines (language 'ms' or 'en'). Clips are processed in order, like a
+conversation, because the router expects the language of the previous utterance.
+
+Example:
+    python benchmark_language_id.py --clips recordings/
+    python benchmark_language_id.py --labels clips.csv --min-confidence 0.9
+"""
+
+import argparse
+import csv
+import os
+import threading
+import time
+import speech_recognition as sr
+from language_recognition import DualLanguageRecognizer, GoogleRecognizer
+from language_id import LanguageRouter
+
+
+class CountingRecognizer:
+    """Wraps a recognizer backend and counts its requests."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def recognize(self, audio, language):
+        with self.lock:
+            self.requests += 1
+        return self.backend.recognize(audio, language)
+
+
+# Function to list the (path, is_malay) of the clips
+def load_clips(clips_dir=None, labels_path=None):
+    clips = []
+    if labels_path:
+        with open(labels_path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and not row[0].startswith('#'):
+                    clips.append((row[0], row[1].strip().lower().startswith('ms')))
+    else:
+        for name in sorted(os.listdir(clips_dir)):
+            if name.lower().endswith('.wav') and name[:2].lower() in ('ms', 'en'):
+                clips.append((os.path.join(clips_dir, name), name[:2].lower() == 'ms'))
+    return clips
+
+
+# Function to run a recognizer over the clips, returns (accuracy, mean seconds, requests per clip)
+def evaluate(recognizer, counter, audios):
+    correct = 0
+    start_time = time.perf_counter()
+    for audio, is_malay in audios:
+        try:
+            result = recognizer.recognize(audio)
+        except sr.RequestError as e:
+            print(f"Request failed: {e}")
+            result = None
+        if result is not None and result['is_malay'] == is_malay:
+            correct += 1
+    elapsed = time.perf_counter() - start_time
+    return correct / len(audios), elapsed / len(audios), counter.requests / len(audios)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Language routing vs dual recognition on recorded clips")
+    parser.add_argument("--clips", help="directory of ms_*.wav and en_*.wav clips")
+    parser.add_argument("--labels", help="CSV file of path,language lines")
+    parser.add_argument("--min-confidence", type=float, default=0.8)
+    args = parser.parse_args()
+    if not args.clips and not args.labels:
+        parser.error("pass --clips or --labels")
+
+    recognizer = sr.Recognizer()
+    audios = []
+    for path, is_malay in load_clips(args.clips, args.labels):
+        with sr.AudioFile(path) as source:
+            audios.append((recognizer.record(source), is_malay))
+    print(f"{len(audios)} clips, {sum(is_malay for _, is_malay in audios)} Malay")
+
+    dual_counter = CountingRecognizer(GoogleRecognizer(recognizer))
+    dual = DualLanguageRecognizer(dual_counter)
+    dual_accuracy, dual_seconds, dual_requests = evaluate(dual, dual_counter, audios)
+
+    router_counter = CountingRecognizer(GoogleRecognizer(recognizer))
+    router = LanguageRouter(router_counter, min_confidence=args.min_confidence)
+    router_accuracy, router_seconds, router_requests = evaluate(router, router_counter, audios)
+
+    print(f"{'':>8} {'accuracy':>9} {'mean s':>8} {'requests':>9}")
+    print(f"{'dual':>8} {dual_accuracy:>9.1%} {dual_seconds:>8.2f} {dual_requests:>9.2f}")
+    print(f"{'router':>8} {router_accuracy:>9.1%} {router_seconds:>8.2f} {router_requests:>9.2f}")
+    stats = router.stats()
+    print(f"Router: {stats.get('single', 0)} single, {stats.get('switched', 0)} switched, "
+          f"{stats.get('second_pass', 0)} decided on both transcripts, "
+          f"language ID {stats['timings'].get('language_id', {}).get('mean_ms', 0):.2f} ms")
@@ -0,0 +1,64 @@
+"""
+This script is used to measure the real-time factor of Malaya transcription before and after MalayaASR.
+
+The real-time factor (RTF) is processing time / audio duration, below 1 is faster than real time.
+- before: the model is built for every utterance, like the old transcribe_with_malaya,
+- persistent: one warm model, one utterance per greedy_decoder call,
+- batched: one warm model, --batch-size utterances per greedy_decoder call.
+Pass --quantized to benchmark the quantized model.
+
+Example:
+    python benchmark_malaya.py recordings/*.wav --batch-size 4
+"""
+
+import argparse
+import time
+import numpy as np
+from malaya_asr import MalayaASR, load_malaya_stt, SAMPLE_RATE
+from vad import wav_frames, wav_sample_rate, to_float32
+
+
+# Function to load a 16 kHz WAV file as float32 samples
+def load_wav(path):
+    if wav_sample_rate(path) != SAMPLE_RATE:
+        raise ValueError(f"{path}: expected {SAMPLE_RATE} Hz audio")
+    return to_float32(np.concatenate(list(wav_frames(path))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time factor of Malaya transcription")
+    parser.add_argument("files", nargs="+", help="16 kHz 16-bit WAV files")
+    parser.add_argument("--quantized", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--skip-before", action="store_true", help="skip the slow per-utterance model loading")
+    args = parser.parse_args()
+
+    audios = [load_wav(path) for path in args.files]
+    audio_seconds = sum(len(audio) for audio in audios) / SAMPLE_RATE
+    print(f"{len(audios)} utterances, {audio_seconds:.1f}s of audio")
+    results = {}
+
+    if not args.skip_before:
+        start_time = time.perf_counter()
+        for audio in audios:
+            load_malaya_stt(quantized=args.quantized).greedy_decoder([audio])
+        results['before'] = time.perf_counter() - start_time
+
+    asr = MalayaASR(quantized=args.quantized, max_batch_size=args.batch_size)
+    asr.warmup().join()
+    print(f"Model loaded in {asr.stt.load_seconds:.1f}s and warmed up")
+
+    start_time = time.perf_counter()
+    transcripts = [asr.transcribe_batch([audio])[0] for audio in audios]
+    results['persistent'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for start in range(0, len(audios), args.batch_size):
+        asr.transcribe_batch(audios[start:start + args.batch_size])
+    results['batched'] = time.perf_counter() - start_time
+
+    print(f"{'':>11} {'seconds':>8} {'RTF':>6}")
+    for name, seconds in results.items():
+        print(f"{name:>11} {seconds:>8.2f} {seconds / audio_seconds:>6.3f}")
+    for path, text in zip(args.files, transcripts):
+        print(f"{path}: {text}")
@@ -0,0 +1,136 @@
+"""
+This module is used to keep the conversation history in the RAG prompt within a token budget.
+
+The most recent turns that fit in max_tokens are kept word for word. Older turns can be folded
+into a rolling summary by the LLM; the summary is made in the background, so a turn never
+waits for it (until it is ready the oldest turns are just left out). The metrics show how many
+prompt tokens the window saves compared to sending the whole history.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import ollama
+
+_encoding = None
+
+
+# Function to load the tiktoken encoding on first use; False when tiktoken is not available
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # tiktoken not installed or its vocabulary cannot be downloaded
+            _encoding = False
+    return _encoding
+
+
+# Function to count tokens (tiktoken when available, otherwise about 4 characters per token)
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+# Function to format a turn the way it is stored in the context
+def format_turn(user_message, nao_message):
+    return f"\nUser: {user_message}\nNao: {nao_message}"
+
+
+# Function to create a summarizer that folds old turns into the previous summary with Ollama
+def ollama_summarizer(model_name='llama3.2'):
+    def summarize(previous_summary, turns_text):
+        prompt = (
+            "Summarize this conversation between a user and Nao in at most three sentences. "
+            "Keep names, facts and open questions.\n"
+            f"Earlier summary: {previous_summary or 'none'}\n"
+            f"Conversation:{turns_text}"
+        )
+        response = ollama.chat(model=model_name, messages=[{'role': 'user', 'content': prompt}])
+        return response['message']['content'].strip()
+    return summarize
+
+
+class ContextWindow:
+    """Builds a bounded context string from a list of (user, nao) turns."""
+
+    def __init__(self, max_tokens=768, summarize_fn=None, max_conversations=1024):
+        self.max_tokens = max_tokens
+        self.max_conversations = max_conversations
+        self.summarize_fn = summarize_fn
+        self.summaries = {}  # conversation key -> (number of turns folded, summary)
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+        self.lock = threading.Lock()
+        self.prompts = 0
+        self.full_tokens = 0
+        self.window_tokens = 0
+
+    def fold(self, key, turns, folded_count, previous_summary):
+        try:
+            summary = self.summarize_fn(previous_summary, "".join(format_turn(u, n) for u, n in turns))
+            with self.lock:
+                # Keep the newest summary if the conversation was forgotten or folded meanwhile
+                if key in self.pending and self.summaries.get(key, (0, ""))[0] < folded_count:
+                    self.summaries.pop(key, None)
+                    self.summaries[key] = (folded_count, summary)
+                    # Conversations that ended by timeout are never forgotten explicitly, keep the newest only
+                    while len(self.summaries) > self.max_conversations:
+                        self.summaries.pop(next(iter(self.summaries)))
+        except Exception as e:
+            print(f"Could not summarize the conversation: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def build(self, turns, key=None):
+        """Return the context for the prompt: the rolling summary plus the newest turns that fit."""
+        turn_texts = [format_turn(user, nao) for user, nao in turns]
+        turn_tokens = [count_tokens(text) for text in turn_texts]
+        with self.lock:
+            folded_count, summary = self.summaries.get(key, (0, ""))
+            if folded_count > len(turns):
+                folded_count, summary = 0, ""  # A new conversation reused the key
+
+        header = f"\nSummary of the earlier conversation: {summary}" if summary else ""
+        budget = self.max_tokens - count_tokens(header)
+        first_kept = len(turns)
+        while first_kept > 0 and turn_tokens[first_kept - 1] <= budget:
+            budget -= turn_tokens[first_kept - 1]
+            first_kept -= 1
+        if first_kept < folded_count:
+            # Turns already in the summary do not need to be repeated
+            first_kept = folded_count
+        context = header + "".join(turn_texts[first_kept:])
+
+        # Fold the turns that fell out of the window into the summary, in the background
+        if self.summarize_fn is not None and key is not None and first_kept > folded_count:
+            with self.lock:
+                if key not in self.pending:
+                    self.pending.add(key)
+                    self.executor.submit(self.fold, key, turns[folded_count:first_kept], first_kept, summary)
+
+        with self.lock:
+            self.prompts += 1
+            self.full_tokens += sum(turn_tokens)
+            self.window_tokens += count_tokens(context)
+        return context
+
+    def forget(self, key):
+        """Drop the summary of a conversation that has ended."""
+        with self.lock:
+            self.summaries.pop(key, None)
+            self.pending.discard(key)
+
+    def stats(self):
+        with self.lock:
+            saved = self.full_tokens - self.window_tokens
+            return {
+                'prompts': self.prompts,
+                'full_history_tokens': self.full_tokens,
+                'window_tokens': self.window_tokens,
+                'saved_tokens': saved,
+                'mean_saved_tokens_per_prompt': saved / self.prompts if self.prompts else 0.0
+            }
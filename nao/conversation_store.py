@@ -0,0 +1,163 @@
+"""
+This module is used to keep a separate conversation for every chat session (robot or kiosk).
+
+A session has one active conversation. It ends when the user says goodbye or after
+idle_timeout seconds without a message, and the next message starts a new one. Two backends:
+
+- MemoryConversationStore: turns kept in memory, each turn appended to
+  contexts/<conversation id>.txt (same format as before), idle sessions evicted from memory.
+- SQLiteConversationStore: turns kept in a SQLite database, nothing held in memory, rows of
+  idle sessions deleted (their turns stay in the database).
+
+Adding a turn is O(1) in both, the context file is never rewritten.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# Function to format turns the way they were stored in the context files
+def format_turns(turns):
+    return "".join(f"\nUser: {user}\nNao: {nao}" for user, nao in turns)
+
+
+class MemoryConversationStore:
+    """In-memory conversations with append-only persistence to text files."""
+
+    def __init__(self, context_dir="contexts", idle_timeout=60):
+        self.context_dir = context_dir
+        self.idle_timeout = idle_timeout
+        os.makedirs(context_dir, exist_ok=True)
+        self.sessions = {}  # session id -> {'conversation_id', 'turns', 'last_active'}
+        self.lock = threading.Lock()
+        self.last_eviction = time.time()
+
+    def evict_idle(self):
+        """Drop conversations idle for longer than idle_timeout (their files stay on disk)."""
+        now = time.time()
+        with self.lock:
+            for session_id in [s for s, c in self.sessions.items() if now - c['last_active'] > self.idle_timeout]:
+                del self.sessions[session_id]
+            self.last_eviction = now
+
+    def conversation(self, session_id):
+        # Scan for idle sessions at most twice per timeout, not on every message
+        if time.time() - self.last_eviction > self.idle_timeout / 2:
+            self.evict_idle()
+        with self.lock:
+            conversation = self.sessions.get(session_id)
+            if conversation is None or time.time() - conversation['last_active'] > self.idle_timeout:
+                conversation = {'conversation_id': str(uuid.uuid4()), 'turns': [], 'last_active': time.time()}
+                self.sessions[session_id] = conversation
+            return conversation
+
+    def get_conversation(self, session_id):
+        """Return (conversation id, list of (user, nao) turns) of the session's active conversation."""
+        conversation = self.conversation(session_id)
+        with self.lock:
+            return conversation['conversation_id'], list(conversation['turns'])
+
+    def get_turns(self, session_id):
+        return self.get_conversation(session_id)[1]
+
+    def get_context(self, session_id):
+        return format_turns(self.get_turns(session_id))
+
+    def append(self, session_id, user_message, nao_message):
+        conversation = self.conversation(session_id)
+        with self.lock:
+            conversation['turns'].append((user_message, nao_message))
+            conversation['last_active'] = time.time()
+            path = os.path.join(self.context_dir, f"{conversation['conversation_id']}.txt")
+            with open(path, "a") as file:
+                file.write(format_turns([(user_message, nao_message)]))
+
+    def end(self, session_id):
+        """End the session's conversation, the next message starts a new one."""
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {'active_sessions': len(self.sessions)}
+
+
+class SQLiteConversationStore:
+    """Conversations stored in SQLite, safe to share between threads and server restarts."""
+
+    def __init__(self, db_path="contexts/conversations.db", idle_timeout=60):
+        self.idle_timeout = idle_timeout
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                            "(session_id TEXT PRIMARY KEY, conversation_id TEXT, last_active REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS turns "
+                            "(conversation_id TEXT, user_message TEXT, nao_message TEXT, time REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation_id)")
+        self.last_eviction = 0.0
+
+    def evict_idle(self):
+        """Delete the rows of sessions idle for longer than idle_timeout."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM sessions WHERE last_active < ?", (now - self.idle_timeout,))
+            self.last_eviction = now
+
+    def conversation_id(self, session_id):
+        now = time.time()
+        # Purge idle sessions at most once per timeout, not on every message
+        if now - self.last_eviction > self.idle_timeout:
+            self.evict_idle()
+        with self.lock, self.db:
+            row = self.db.execute("SELECT conversation_id, last_active FROM sessions WHERE session_id = ?",
+                                  (session_id,)).fetchone()
+            if row is not None and now - row[1] <= self.idle_timeout:
+                return row[0]
+            conversation_id = str(uuid.uuid4())
+            self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, conversation_id, now))
+            return conversation_id
+
+    def get_conversation(self, session_id):
+        conversation_id = self.conversation_id(session_id)
+        with self.lock:
+            return conversation_id, self.db.execute("SELECT user_message, nao_message FROM turns "
+                                                    "WHERE conversation_id = ? ORDER BY rowid",
+                                                    (conversation_id,)).fetchall()
+
+    def get_turns(self, session_id):
+        return self.get_conversation(session_id)[1]
+
+    def get_context(self, session_id):
+        return format_turns(self.get_turns(session_id))
+
+    def append(self, session_id, user_message, nao_message):
+        conversation_id = self.conversation_id(session_id)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT INTO turns VALUES (?, ?, ?, ?)", (conversation_id, user_message, nao_message, now))
+            self.db.execute("UPDATE sessions SET last_active = ? WHERE session_id = ?", (now, session_id))
+
+    def end(self, session_id):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self):
+        with self.lock:
+            active = self.db.execute("SELECT COUNT(*) FROM sessions WHERE last_active >= ?",
+                                     (time.time() - self.idle_timeout,)).fetchone()[0]
+        return {'active_sessions': active}
+
+
+# Function to create a conversation store by backend name ('memory' or 'sqlite')
+def create_conversation_store(backend="memory", context_dir="contexts", idle_timeout=60):
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.path.join(context_dir, "conversations.db"), idle_timeout=idle_timeout)
+    if backend == "memory":
+        return MemoryConversationStore(context_dir, idle_timeout=idle_timeout)
+    raise ValueError(f"Unknown conversation store backend '{backend}', choose 'memory' or 'sqlite'")
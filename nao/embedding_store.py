@@ -0,0 +1,115 @@
+"""
+This module is used to keep the SBERT and Ollama embeddings of the dataset on disk.
+
+Each store is a memory-mappable float32 matrix (<name>.f32) plus a JSON metadata file
+(<name>.json) that lists the content hash of every row. The name is the model name plus a hash
+of the dataset path, so datasets embedded with the same model do not overwrite each other. On restart only the instructions
+whose hash is not in the store yet (new or changed rows) are embedded again.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+# Default directory for the embedding stores
+EMBEDDING_STORE_DIR = "embedding_store"
+
+
+# Function to compute the key of a row from its text and the model that embedded it
+def content_hash(text, model_name):
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent float32 embedding matrix keyed by content hash, model name and dataset."""
+
+    def __init__(self, model_name, store_dir=EMBEDDING_STORE_DIR, dataset_path=None):
+        self.model_name = model_name
+        self.store_dir = store_dir
+        # Model names such as 'llama3.2:1b' or 'sentence-transformers/x' are not valid file names
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+        if dataset_path is not None:
+            dataset_key = hashlib.sha1(os.path.abspath(dataset_path).encode("utf-8")).hexdigest()[:12]
+            safe_name = f"{safe_name}-{dataset_key}"
+        self.matrix_path = os.path.join(store_dir, f"{safe_name}.f32")
+        self.meta_path = os.path.join(store_dir, f"{safe_name}.json")
+        self.keys = []
+        self.matrix = None
+        self.load()
+
+    def load(self):
+        """Memory-map the matrix on disk, or start empty if there is no usable store."""
+        self.keys, self.matrix = [], None
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.matrix_path)):
+            return
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get("model_name") != self.model_name or not meta.get("keys"):
+                return
+            shape = (len(meta["keys"]), meta["dim"])
+            if os.path.getsize(self.matrix_path) != shape[0] * shape[1] * 4:
+                print(f"Embedding store {self.matrix_path} is truncated, rebuilding it.")
+                return
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=shape)
+            self.keys = meta["keys"]
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Could not load embedding store {self.meta_path}: {e}")
+
+    def save(self, keys, matrix):
+        """Write the matrix and its metadata, replacing the previous files atomically."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        # Release the old mapping first, Windows cannot replace a file that is still mapped
+        self.matrix = None
+        matrix.tofile(self.matrix_path + ".tmp")
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump({"model_name": self.model_name, "dim": int(matrix.shape[1]), "keys": keys}, f)
+        os.replace(self.matrix_path + ".tmp", self.matrix_path)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+        self.load()
+
+    def embed(self, texts, embed_fn):
+        """
+        Return one embedding per text, calling embed_fn only for texts missing from the store.
+
+        embed_fn takes a list of texts and returns a list of vectors (None for a failed row).
+        Failed rows are returned as None and are not stored, so they are retried next time.
+        The store is rewritten to hold exactly the rows of texts, dropping stale entries.
+        """
+        keys = [content_hash(text, self.model_name) for text in texts]
+        row_of = {key: i for i, key in enumerate(self.keys)}
+        # Index of the first occurrence of every key that is not stored yet
+        missing, seen = [], set()
+        for i, key in enumerate(keys):
+            if key not in row_of and key not in seen:
+                seen.add(key)
+                missing.append(i)
+
+        # Warm start with an unchanged dataset: serve rows straight from the mapped matrix
+        if not missing and keys == self.keys and self.matrix is not None:
+            return list(self.matrix)
+
+        rows = [None] * len(texts)
+        for i, key in enumerate(keys):
+            if key in row_of:
+                rows[i] = np.array(self.matrix[row_of[key]])
+
+        if missing:
+            print(f"Embedding {len(missing)} new or changed rows with {self.model_name}...")
+            new_rows = embed_fn([texts[i] for i in missing])
+            # Texts with the same content share one key, fill every occurrence
+            new_by_key = {keys[i]: row for i, row in zip(missing, new_rows)}
+            for i, key in enumerate(keys):
+                if rows[i] is None and new_by_key.get(key) is not None:
+                    rows[i] = np.asarray(new_by_key[key], dtype=np.float32)
+
+        stored = {}
+        for key, row in zip(keys, rows):
+            if row is not None:
+                stored.setdefault(key, row)
+        # Rewrite only when the set of rows changed, e.g. not for duplicated instructions
+        if stored and list(stored) != self.keys:
+            self.save(list(stored), np.vstack(list(stored.values())))
+        return rows
@@ -0,0 +1,169 @@
+"""
+This module is used to embed texts with SBERT and Ollama.
+
+For the dataset, SBERT encodes a whole batch in one forward pass, and Ollama receives one
+/api/embed request per batch instead of one per text, with a few requests in flight at the
+same time. Progress and throughput (rows per second) are printed while embedding.
+
+For queries, QueryEmbedder runs SBERT and Ollama concurrently so a query costs
+max(sbert, ollama) instead of their sum.
+"""
+
+import threading
+import time
+import ollama
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from timings import StageTimings
+
+# Default batch size and number of concurrent Ollama requests
+EMBED_BATCH_SIZE = 64
+OLLAMA_MAX_CONCURRENCY = 4
+
+
+class Progress:
+    """Prints how many rows are done and the throughput in rows per second."""
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.start_time = time.perf_counter()
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start_time
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, rows):
+        self.done += rows
+        print(f"\r{self.label}: {self.done}/{self.total} rows ({self.rate():.1f} rows/s)", end='', flush=True)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start_time
+        print(f"\r{self.label}: {self.done}/{self.total} rows in {elapsed:.1f}s ({self.rate():.1f} rows/s)")
+
+
+# Function to split a list into batches
+def batches(items, batch_size):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+# Function to embed texts with SBERT, one forward pass per batch
+def embed_sbert_batched(sbert_model, texts, batch_size=EMBED_BATCH_SIZE):
+    progress = Progress("SBERT embedding", len(texts))
+    embeddings = []
+    for batch in batches(texts, batch_size):
+        embeddings.extend(sbert_model.encode(batch, batch_size=batch_size))
+        progress.update(len(batch))
+    progress.finish()
+    return embeddings
+
+
+# Function to embed texts with Ollama, one request per batch and at most max_concurrency in flight
+# A failed batch gives None for its rows, so the embedding store retries them next time
+def embed_ollama_batched(texts, model_name='llama3.2', batch_size=EMBED_BATCH_SIZE,
+                         max_concurrency=OLLAMA_MAX_CONCURRENCY):
+    progress = Progress(f"Ollama embedding ({model_name})", len(texts))
+    text_batches = batches(texts, batch_size)
+    results = [None] * len(text_batches)
+
+    def embed_batch(batch):
+        return ollama.embed(model=model_name, input=batch).get('embeddings', [])
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(embed_batch, batch): i for i, batch in enumerate(text_batches)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print(f"\nOllama embedding failed for batch {i}: {e}")
+            progress.update(len(text_batches[i]))
+    progress.finish()
+
+    embeddings = []
+    for batch, result in zip(text_batches, results):
+        if result is None or len(result) != len(batch):
+            embeddings.extend([None] * len(batch))
+        else:
+            embeddings.extend(result)
+    return embeddings
+
+
+class QueryEmbedder:
+    """
+    Embeds queries with SBERT and Ollama at the same time on a shared executor.
+
+    submit() returns a Future right away, so a caller can start embedding as soon as the
+    transcript is known and do other work (loading context, behavior matching) meanwhile.
+    Results go through the query embedding cache, and a query that is already being embedded
+    is not embedded twice. Timings of the 'sbert', 'ollama' and 'total' stages are recorded,
+    'total' should be close to max(sbert, ollama) rather than their sum.
+    """
+
+    def __init__(self, sbert_model, sbert_model_name, cache=None, executor=None):
+        self.sbert_model = sbert_model
+        self.sbert_model_name = sbert_model_name
+        self.cache = cache
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-embed")
+        self.timings = StageTimings()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def timed(self, stage, fn, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.timings.record(stage, time.perf_counter() - start_time)
+
+    def submit(self, query, ollama_model_name='llama3.2'):
+        cache_model_name = f"{self.sbert_model_name}+{ollama_model_name}"
+        if self.cache is not None:
+            cached_embedding = self.cache.get(query, cache_model_name)
+            if cached_embedding is not None:
+                future = Future()
+                future.set_result(cached_embedding)
+                return future
+
+        pending_key = (cache_model_name, query)
+        with self.lock:
+            if pending_key in self.pending:
+                return self.pending[pending_key]
+            result = Future()
+            self.pending[pending_key] = result
+
+        start_time = time.perf_counter()
+        if hasattr(self.sbert_model, 'submit'):
+            # A micro-batching encoder queues the query itself, no executor thread waits for it
+            sbert_future = self.sbert_model.submit(query)
+            sbert_future.add_done_callback(lambda _: self.timings.record('sbert', time.perf_counter() - start_time))
+        else:
+            sbert_future = self.executor.submit(self.timed, 'sbert', self.sbert_model.encode, query)
+        ollama_future = self.executor.submit(
+            self.timed, 'ollama',
+            lambda: ollama.embed(model=ollama_model_name, input=query).get('embeddings', [None])[0]
+        )
+
+        def on_done(_):
+            if not (sbert_future.done() and ollama_future.done()):
+                return
+            with self.lock:
+                # Both callbacks can see both futures done, only the first one completes the result
+                if self.pending.pop(pending_key, None) is None:
+                    return
+            self.timings.record('total', time.perf_counter() - start_time)
+            error = sbert_future.exception() or ollama_future.exception()
+            if error is not None:
+                result.set_exception(error)
+                return
+            query_embedding = {'sbert': sbert_future.result(), 'ollama': ollama_future.result()}
+            if self.cache is not None:
+                self.cache.put(query, cache_model_name, query_embedding)
+            result.set_result(query_embedding)
+
+        sbert_future.add_done_callback(on_done)
+        ollama_future.add_done_callback(on_done)
+        return result
+
+    def embed(self, query, ollama_model_name='llama3.2'):
+        return self.submit(query, ollama_model_name).result()
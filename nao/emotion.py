@@ -0,0 +1,150 @@
+"""
+This module is used to classify the emotion of NAO's replies off the critical path.
+
+EmotionClassifier wraps a text-classification pipeline:
+- submit(text) classifies in a background thread and returns a Future of the label, so the
+  reply can be sent to NAO while the emotion is still being classified.
+- Labels are cached by the normalized reply text, so repeated replies are not classified again.
+- classify_batch(texts) classifies several texts in one forward pass.
+
+load_emotion_pipeline(model_name, backend) loads the model with one of the EMOTION_BACKENDS:
+- 'pipeline': the transformers pipeline (from the model service when it is running).
+- 'onnx': the model exported to ONNX and quantized to int8 with optimum (needs optimum[onnxruntime]),
+  the quantized model is saved in EMOTION_MODEL_DIR and reused on the next start.
+- 'int8': the PyTorch model with its Linear layers dynamically quantized to int8, on the CPU.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from query_cache import normalize_query
+from timings import StageTimings
+
+EMOTION_MODEL_NAME = "michellejieli/emotion_text_classifier"
+EMOTION_MODEL_DIR = "emotion_models"
+EMOTION_BACKENDS = ('pipeline', 'onnx', 'int8')
+
+
+# Function to load the transformers pipeline with its Linear layers quantized to int8 (CPU only)
+def load_int8_pipeline(model_name):
+    import torch
+    from transformers import pipeline
+    classifier = pipeline("text-classification", model=model_name, device=-1)
+    classifier.model = torch.quantization.quantize_dynamic(classifier.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return classifier
+
+
+# Function to load the model exported to ONNX and quantized to int8, exporting it on the first run
+def load_onnx_pipeline(model_name, model_dir=EMOTION_MODEL_DIR):
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer, pipeline
+
+    save_dir = os.path.join(model_dir, model_name.replace('/', '__') + "-onnx-int8")
+    if not os.path.exists(os.path.join(save_dir, "model_quantized.onnx")):
+        print(f"Exporting {model_name} to ONNX int8 in {save_dir}")
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(save_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(save_dir)
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantizer.quantize(save_dir=save_dir,
+                           quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+    model = ORTModelForSequenceClassification.from_pretrained(save_dir, file_name="model_quantized.onnx")
+    return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(save_dir))
+
+
+# Function to load the emotion classifier with the given backend
+def load_emotion_pipeline(model_name=EMOTION_MODEL_NAME, backend='pipeline'):
+    if backend == 'pipeline':
+        from model_service import get_emotion_model
+        return get_emotion_model(model_name)
+    if backend == 'onnx':
+        try:
+            return load_onnx_pipeline(model_name)
+        except ImportError as e:
+            print(f"ONNX backend not available ({e}), using the int8 PyTorch model")
+            return load_int8_pipeline(model_name)
+    if backend == 'int8':
+        return load_int8_pipeline(model_name)
+    raise ValueError(f"Unknown emotion backend '{backend}', expected one of {EMOTION_BACKENDS}")
+
+
+class EmotionClassifier:
+    """Background, cached emotion classification of reply texts."""
+
+    def __init__(self, classifier, max_entries=512, batch_size=8):
+        self.classifier = classifier  # A text-classification pipeline (or a LazyModel of one)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.labels = OrderedDict()  # normalized text -> label
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="emotion")
+        self.timings = StageTimings()
+
+    def cached(self, key):
+        with self.lock:
+            label = self.labels.get(key)
+            if label is None:
+                self.misses += 1
+                return None
+            self.labels.move_to_end(key)
+            self.hits += 1
+            return label
+
+    def remember(self, key, label):
+        with self.lock:
+            self.labels[key] = label
+            self.labels.move_to_end(key)
+            while len(self.labels) > self.max_entries:
+                self.labels.popitem(last=False)
+
+    def classify(self, text):
+        """Return the emotion label of the text (e.g. 'joy')."""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts):
+        """Return the emotion labels of several texts, classifying the uncached ones in one pass."""
+        keys = [normalize_query(text) for text in texts]
+        labels = [self.cached(key) for key in keys]
+        missing = [i for i, label in enumerate(labels) if label is None]
+        if missing:
+            for i, label in zip(missing, self.run_classifier([texts[i] for i in missing])):
+                labels[i] = label
+                self.remember(keys[i], label)
+        return labels
+
+    def run_classifier(self, texts):
+        start_time = time.perf_counter()
+        results = self.classifier(texts, batch_size=self.batch_size, truncation=True)
+        self.timings.record('classify', time.perf_counter() - start_time)
+        return [result['label'] for result in results]
+
+    def submit(self, text):
+        """Classify the text in the background, returns a Future of its label."""
+        key = normalize_query(text)
+        label = self.cached(key)
+        if label is not None:
+            future = Future()
+            future.set_result(label)
+            return future
+
+        def classify_missing():
+            label = self.run_classifier([text])[0]
+            self.remember(key, label)
+            return label
+        return self.executor.submit(classify_missing)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            cache = {
+                'entries': len(self.labels),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+        return {'cache': cache, 'timings': self.timings.stats()}
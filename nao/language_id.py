@@ -0,0 +1,187 @@
+"""
+This module is used to pick the language of an utterance with one recognition instead of two.
+
+NGramLanguageIdentifier is a character n-gram (1 to 3) naive Bayes classifier for Malay and
+English. It is trained on the built-in sentences below plus the marker words, and more text can
+be added with train() (e.g. past transcripts). identify(text) returns (language, confidence).
+
+LanguageRouter recognizes the utterance once in the expected language (the language of the
+previous utterance), identifies the language of that first-pass transcript and:
+- returns it when it is the expected language with at least min_confidence,
+- recognizes once more in the other language when that one is identified with min_confidence,
+- otherwise recognizes once more in the other language and picks between the two transcripts
+  with the marker words (decide_language), as the dual recognition does.
+The first-pass transcript is kept, so an utterance costs at most two recognitions, and as
+conversations mostly stay in one language, most utterances cost a single one.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter
+from language_recognition import MALAY, ENGLISH, LANGUAGE_MARKERS, recognition_result, decide_language
+from timings import StageTimings
+
+TRAINING_SENTENCES = {
+    ENGLISH: [
+        "hello nao how are you today",
+        "what is the school of digital science",
+        "can you tell me about the university",
+        "where is the library and when does it open",
+        "who is the dean of the faculty",
+        "i would like to know more about the computer science programme",
+        "thank you very much that was really helpful",
+        "please wave at me",
+        "what courses can i take in my first year",
+        "do you know where the cafeteria is",
+        "how many students study here",
+        "tell me a joke",
+        "yes please do that now",
+        "no thanks maybe later",
+        "what is your name and where do you come from",
+        "good morning it is nice to meet you",
+        "could you explain what artificial intelligence is",
+        "which building should i go to for the exam",
+        "i am happy to be here",
+        "goodbye and have a nice day",
+    ],
+    MALAY: [
+        "apa khabar nao",
+        "apakah sekolah sains digital",
+        "boleh awak ceritakan tentang universiti ini",
+        "di mana perpustakaan dan bila ia dibuka",
+        "siapa dekan fakulti ini",
+        "saya ingin tahu lebih lanjut tentang program sains komputer",
+        "terima kasih banyak itu sangat membantu",
+        "tolong lambai kepada saya",
+        "kursus apa yang boleh saya ambil pada tahun pertama",
+        "adakah awak tahu di mana kafeteria",
+        "berapa ramai pelajar belajar di sini",
+        "ceritakan satu jenaka",
+        "ya tolong buat sekarang",
+        "tidak terima kasih mungkin nanti",
+        "siapa nama awak dan dari mana awak datang",
+        "selamat pagi gembira berjumpa dengan awak",
+        "boleh terangkan apa itu kecerdasan buatan",
+        "bangunan mana yang perlu saya pergi untuk peperiksaan",
+        "saya gembira berada di sini",
+        "selamat tinggal semoga hari anda baik",
+    ],
+}
+
+
+# Function to get the character n-grams of a text, words padded with spaces
+def char_ngrams(text, orders=(1, 2, 3)):
+    text = " " + re.sub(r"[^\w']+", " ", text.lower()).strip() + " "
+    return [text[i:i + n] for n in orders for i in range(len(text) - n + 1) if text[i:i + n].strip()]
+
+
+class NGramLanguageIdentifier:
+    """Character n-gram naive Bayes over Malay and English."""
+
+    def __init__(self, confidence_scale=4.0):
+        self.confidence_scale = confidence_scale  # Turns the mean log-likelihood difference into a probability
+        self.counts = {language: Counter() for language in (MALAY, ENGLISH)}
+        self.totals = {language: 0 for language in self.counts}
+        self.vocabulary = set()
+        for language, sentences in TRAINING_SENTENCES.items():
+            self.train(sentences + sorted(LANGUAGE_MARKERS[language]), language)
+
+    def train(self, texts, language):
+        for text in texts:
+            ngrams = char_ngrams(text)
+            self.counts[language].update(ngrams)
+            self.totals[language] += len(ngrams)
+            self.vocabulary.update(ngrams)
+
+    def identify(self, text):
+        """Return (language, confidence between 0.5 and 1), or (None, 0.0) for empty text."""
+        ngrams = char_ngrams(text or "")
+        if not ngrams:
+            return None, 0.0
+        size = len(self.vocabulary) + 1
+        scores = {}
+        for language, counts in self.counts.items():
+            total = self.totals[language] + size
+            scores[language] = sum(math.log((counts[ngram] + 1) / total) for ngram in ngrams) / len(ngrams)
+        best, other = sorted(scores, key=scores.get, reverse=True)
+        difference = scores[best] - scores[other]
+        return best, 1 / (1 + math.exp(-self.confidence_scale * difference))
+
+
+class LanguageRouter:
+    """One recognition in the expected language, a second one in the other language only when needed."""
+
+    def __init__(self, backend, identifier=None, min_confidence=0.8, language=ENGLISH):
+        self.backend = backend
+        self.identifier = identifier or NGramLanguageIdentifier()
+        self.min_confidence = min_confidence
+        self.language = language  # Expected language, follows the conversation
+        self.counts = Counter()
+        self.timings = StageTimings()
+        self.lock = threading.Lock()
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def recognize(self, audio):
+        """Return {'text', 'is_malay', 'confidence'}, or None when nothing was recognized."""
+        start_time = time.perf_counter()
+        result = self.route(audio)
+        self.timings.record('recognition', time.perf_counter() - start_time)
+        if result is not None:
+            self.language = MALAY if result['is_malay'] else ENGLISH
+        return result
+
+    def identify(self, text):
+        start_time = time.perf_counter()
+        try:
+            return self.identifier.identify(text)
+        finally:
+            self.timings.record('language_id', time.perf_counter() - start_time)
+
+    def route(self, audio):
+        first_language = self.language
+        other_language = ENGLISH if first_language == MALAY else MALAY
+        first_text = self.backend.recognize(audio, first_language)
+        if not first_text:
+            # Nothing recognized in the expected language, the utterance is likely in the other one
+            self.count('switched')
+            text = self.backend.recognize(audio, other_language)
+            if not text:
+                return None
+            language, confidence = self.identify(text)
+            return self.result(recognition_result(text, other_language), language, confidence)
+
+        language, confidence = self.identify(first_text)
+        if confidence >= self.min_confidence and language == first_language:
+            self.count('single')
+            return self.result(recognition_result(first_text, first_language), language, confidence)
+
+        other_text = self.backend.recognize(audio, other_language)
+        if confidence >= self.min_confidence:
+            self.count('switched')
+            if other_text:
+                return self.result(recognition_result(other_text, other_language), language, confidence)
+            return self.result(recognition_result(first_text, first_language), language, confidence)
+
+        # Low confidence: both transcripts are available now, the marker words decide
+        self.count('second_pass')
+        if not other_text:
+            return self.result(recognition_result(first_text, first_language), language, confidence)
+        transcripts = {first_language: first_text, other_language: other_text}
+        return self.result(decide_language(transcripts[MALAY], transcripts[ENGLISH]), language, confidence)
+
+    def result(self, result, identified_language, confidence):
+        # Confidence of the identifier that the returned transcript is in the returned language
+        returned_language = MALAY if result['is_malay'] else ENGLISH
+        result['confidence'] = confidence if identified_language == returned_language else 1 - confidence
+        return result
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts['timings'] = self.timings.stats()
+        return counts
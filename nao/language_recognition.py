@@ -0,0 +1,161 @@
+"""
+This module is used to recognize an utterance in Malay and English at the same time.
+
+DualLanguageRecognizer sends the audio to the recognizer for both languages concurrently and
+returns as soon as the language is certain:
+- one side failed (nothing recognized): the other side's transcript is used as soon as it arrives,
+- the first transcript has at least marker_threshold marker words of its own language,
+- otherwise both transcripts are compared with the marker words, as before.
+So an utterance costs about one recognition round trip instead of two.
+
+The recognizer backend is pluggable: any object with recognize(audio, language) that returns the
+transcript, or None when nothing was recognized (and raises on request errors), can be used,
+e.g. a local model or a stand-in returning fixed transcripts.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from timings import StageTimings
+
+MALAY = 'ms'
+ENGLISH = 'en-US'
+
+ENGLISH_MARKERS = {
+    'hello', 'hi', 'hey', 'how', 'are', 'you', 'what', 'when', 'where', 'why', 'who',
+    'the', 'is', 'am', 'are', 'this', 'that', 'it', 'we', 'they', 'do', 'does', 'did',
+    'can', 'could', 'would', 'will', 'shall', 'should', 'your', 'my', 'mine', 'their',
+    'our', 'and', 'or', 'with', 'for', 'about', 'from', 'at', 'of', 'in', 'on', 'up',
+    'down', 'yes', 'no', 'please', 'thank', 'thanks', 'okay', 'really', 'know', 'think',
+    'believe', 'understand', 'like', 'want', 'need', 'good', 'bad', 'happy', 'sad',
+    'love', 'hate'
+}
+
+MALAY_MARKERS = {
+    'apa', 'bila', 'siapa', 'mengapa', 'bagaimana', 'saya', 'awak', 'anda', 'dia',
+    'mereka', 'ini', 'itu', 'dan', 'atau', 'dengan', 'kerana', 'sebab', 'jika', 'kalau',
+    'tak', 'tidak', 'boleh', 'hendak', 'mahu', 'suka', 'cinta', 'baik', 'buruk',
+    'gembira', 'sedih', 'betul', 'salah', 'tahu', 'faham', 'kenal', 'ingat', 'percaya',
+    'kami', 'kita', 'korang', 'punya', 'jangan', 'kenapa', 'macam', 'sudah',
+    'belum', 'nanti', 'lah', 'kah', 'ke', 'ya'
+}
+
+LANGUAGE_MARKERS = {MALAY: MALAY_MARKERS, ENGLISH: ENGLISH_MARKERS}
+
+
+# Function to count the marker words of a language in a transcript
+def count_markers(text, language):
+    markers = LANGUAGE_MARKERS[language]
+    return sum(1 for word in text.lower().split() if word in markers)
+
+
+# Function to build the result returned to the caller
+def recognition_result(text, language):
+    return {'text': text, 'is_malay': language == MALAY}
+
+
+# Function to pick the language when both recognitions returned a transcript
+def decide_language(malay_text, english_text):
+    english_count = count_markers(english_text, ENGLISH)
+    malay_count = count_markers(malay_text, MALAY)
+
+    # If we found marker words, use them to determine language
+    if english_count > 0 or malay_count > 0:
+        if english_count >= malay_count:
+            return recognition_result(english_text, ENGLISH)
+        return recognition_result(malay_text, MALAY)
+
+    # Fallback to word count if no markers found
+    if len(english_text.split()) > len(malay_text.split()):
+        return recognition_result(english_text, ENGLISH)
+    return recognition_result(malay_text, MALAY)
+
+
+class GoogleRecognizer:
+    """Google Speech Recognition through speech_recognition."""
+
+    def __init__(self, recognizer=None):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def recognize(self, audio, language):
+        try:
+            return self.recognizer.recognize_google(audio, language=language) or None
+        except self.sr.UnknownValueError:
+            return None
+
+
+class DualLanguageRecognizer:
+    """Malay and English recognition in parallel, resolved as early as the language is certain."""
+
+    def __init__(self, backend, marker_threshold=2, max_workers=4):
+        self.backend = backend
+        self.marker_threshold = marker_threshold
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr")
+        self.timings = StageTimings()
+        self.early = 0
+        self.both = 0
+        self.lock = threading.Lock()
+
+    def recognize_language(self, audio, language):
+        start_time = time.perf_counter()
+        try:
+            return self.backend.recognize(audio, language)
+        finally:
+            self.timings.record(language, time.perf_counter() - start_time)
+
+    def recognize(self, audio):
+        """Return {'text', 'is_malay'}, or None when neither language was recognized."""
+        start_time = time.perf_counter()
+        futures = {self.executor.submit(self.recognize_language, audio, language): language
+                   for language in (MALAY, ENGLISH)}
+        try:
+            result = self.resolve(futures)
+        finally:
+            self.timings.record('recognition', time.perf_counter() - start_time)
+        return result
+
+    def resolve(self, futures):
+        transcripts = {}
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                language = futures[future]
+                try:
+                    transcripts[language] = future.result()
+                except Exception as e:
+                    transcripts[language] = None
+                    errors.append(e)
+
+            if pending:
+                # Decide early when the finished side is a confident transcript
+                for language, text in transcripts.items():
+                    if text and count_markers(text, language) >= self.marker_threshold:
+                        with self.lock:
+                            self.early += 1
+                        for future in pending:
+                            future.cancel()  # Its request keeps running, but nobody waits for it
+                        return recognition_result(text, language)
+
+        with self.lock:
+            self.both += 1
+        malay_text, english_text = transcripts.get(MALAY), transcripts.get(ENGLISH)
+        if malay_text and english_text:
+            return decide_language(malay_text, english_text)
+        # If only one language was recognized, use that
+        if malay_text:
+            return recognition_result(malay_text, MALAY)
+        if english_text:
+            return recognition_result(english_text, ENGLISH)
+        if errors:
+            raise errors[0]
+        return None
+
+    def stats(self):
+        with self.lock:
+            counts = {'early_resolutions': self.early, 'waited_for_both': self.both}
+        counts['timings'] = self.timings.stats()
+        return counts
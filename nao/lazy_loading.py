@@ -0,0 +1,91 @@
+"""
+This module is used to defer heavy imports and model loading until they are first needed.
+
+- lazy_import("gtts") returns the module without executing it; it is imported on first
+  attribute access.
+- LazyModel("SBERT", loader) behaves like the loaded model, which is loaded on first use
+  (attribute access or call), or earlier in a background thread with warmup().
+- StartupTimer reports the time from script start to ready, so startup regressions show up.
+"""
+
+import importlib.util
+import sys
+import threading
+import time
+
+
+# Function to import a module lazily (the recipe from the importlib documentation)
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyModel:
+    """Proxy for a model that is loaded by loader() the first time it is used."""
+
+    def __init__(self, name, loader):
+        self._name = name
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start_time = time.perf_counter()
+                    model = self._loader()
+                    self.load_seconds = time.perf_counter() - start_time
+                    print(f"Loaded {self._name} in {self.load_seconds:.1f}s")
+                    self._model = model
+        return self._model
+
+    def is_loaded(self):
+        return self._model is not None
+
+    def warmup(self):
+        """Start loading in a background thread, first use then waits only for what is left."""
+        thread = threading.Thread(target=self.get, name=f"warmup-{self._name}", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, attribute):
+        # Only called for attributes the proxy does not have itself
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        return getattr(self.get(), attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+
+class StartupTimer:
+    """Measures the time from script start to ready, and the stages in between."""
+
+    def __init__(self, start_time=None):
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.stages = []
+
+    def mark(self, stage):
+        self.stages.append((stage, time.perf_counter() - self.start_time))
+
+    def ready(self, name):
+        elapsed = time.perf_counter() - self.start_time
+        stages = ", ".join(f"{stage} at {seconds:.2f}s" for stage, seconds in self.stages)
+        print(f"{name} ready in {elapsed:.2f}s" + (f" ({stages})" if stages else ""))
+        return elapsed
+
+
+# Function to warm up several lazy models at once, returns the threads
+def warmup(*models):
+    return [model.warmup() for model in models]
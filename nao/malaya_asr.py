@@ -0,0 +1,103 @@
+"""
+This module is used to keep one Malaya speech-to-text model loaded and decode utterances in batches.
+
+MalayaASR loads malaya_speech.stt.deep_transducer once (optionally the quantized model, which is
+smaller and faster on CPU with a small accuracy cost) and keeps it warm: warmup() loads it in the
+background and decodes a short silence, so the TensorFlow graph is built before the first turn.
+Utterances submitted from several threads within max_wait_ms of each other are decoded together
+in one greedy_decoder call. The real-time factor (decode time / audio time) is kept for stats().
+"""
+
+import importlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from lazy_loading import LazyModel
+from micro_batcher import Histogram
+
+SAMPLE_RATE = 16000
+MALAYA_STT_MODEL = 'conformer'
+
+
+# Function to load the Malaya transducer model
+def load_malaya_stt(model=MALAYA_STT_MODEL, quantized=False):
+    malaya_speech = importlib.import_module("malaya_speech")
+    return malaya_speech.stt.deep_transducer(model=model, quantized=quantized)
+
+
+class MalayaASR:
+    """A warm Malaya transducer with batched greedy decoding."""
+
+    def __init__(self, model=MALAYA_STT_MODEL, quantized=False, max_batch_size=4, max_wait_ms=20):
+        name = f"Malaya STT ({model}{', quantized' if quantized else ''})"
+        self.stt = LazyModel(name, lambda: load_malaya_stt(model, quantized))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16])
+        self.audio_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.run, name="malaya-asr", daemon=True)
+        self.worker.start()
+
+    def warmup(self):
+        """Load the model and decode half a second of silence in a background thread."""
+        # Not counted in the stats, so the real-time factor only covers real utterances
+        silence = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
+        thread = threading.Thread(target=lambda: self.stt.greedy_decoder([silence]),
+                                  name="malaya-asr-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def transcribe_batch(self, audios):
+        """Decode float32 16 kHz utterances in one greedy_decoder call, returns their texts."""
+        start_time = time.perf_counter()
+        texts = self.stt.greedy_decoder(list(audios))
+        elapsed = time.perf_counter() - start_time
+        with self.lock:
+            self.audio_seconds += sum(len(audio) for audio in audios) / SAMPLE_RATE
+            self.decode_seconds += elapsed
+        self.batch_sizes.record(len(audios))
+        return [text.strip() for text in texts]
+
+    def submit(self, audio):
+        """Queue one utterance for decoding, returns a Future of its text."""
+        future = Future()
+        self.requests.put((np.asarray(audio, dtype=np.float32), future))
+        return future
+
+    def transcribe(self, audio):
+        return self.submit(audio).result()
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                texts = self.transcribe_batch([audio for audio, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def stats(self):
+        with self.lock:
+            rtf = self.decode_seconds / self.audio_seconds if self.audio_seconds else 0.0
+            totals = {'audio_seconds': self.audio_seconds, 'decode_seconds': self.decode_seconds,
+                      'real_time_factor': rtf}
+        totals['batch_size'] = self.batch_sizes.stats()
+        totals['load_seconds'] = self.stt.load_seconds
+        return totals
@@ -5,14 +5,28 @@ But overral, the accuracy is good.
 malayvenv is the virtual environment for malaya.
 """
 
-import malaya_speech
+import time
+SCRIPT_START = time.perf_counter()
+
+import argparse
+import importlib
 import ollama
 import requests
 import pyaudio
 import wave
 import os
-import time
-import numpy as np
+from vad import Endpointer, listen, save_wav, to_float32
+from lazy_loading import LazyModel, StartupTimer
+from malaya_asr import MalayaASR
+
+# malaya-speech imports TensorFlow, so it is imported on first use (or in the background with --warmup)
+malaya_speech = LazyModel("malaya-speech", lambda: importlib.import_module("malaya_speech"))
+
+# The STT model is loaded once, on first use (or in the background with --warmup)
+malaya_asr = None
+
+# Ends each utterance 0.6 s after the speaker stops; the noise floor carries over between turns
+endpointer = Endpointer(sample_rate=16000, hangover_ms=600, pre_roll_ms=300, max_utterance_s=15)
 
 # Function to play audio using PyAudio (remains unchanged)
 def play_audio(file_path):
@@ -31,68 +45,30 @@ def play_audio(file_path):
     p.terminate()
 
 # Function to transcribe the recorded audio using Malaya
-def transcribe_with_malaya(audio_file):
-    # Load audio file
-    y, sr = malaya_speech.load(audio_file)
-    # Initialize the STT model
-    stt = malaya_speech.stt.deep_transducer()
-    # Perform greedy decoding
-    transcription = stt.greedy_decoder([y])
-    transcription_text = transcription[0]  # Assuming single audio input
-    print(f"Transcribed Text: {transcription_text.strip()}")
-    return transcription_text.strip()
-
-# Function to record audio with a threshold
-def record_audio(file_path, threshold=500, sample_rate=16000, duration=5):
-    p = pyaudio.PyAudio()
-    stream = p.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=1024)
-    frames = []
-    print("Listening for audio above the threshold...")
-
-    start_time = None
-    silence_time = None
-    max_silence_duration = 2  # Maximum allowable silence duration
-    
-    while True:
-        data = stream.read(1024)
-        audio_data = np.frombuffer(data, dtype=np.int16)
-        amplitude = np.abs(audio_data).mean()  # Calculate the mean amplitude
-        
-        if amplitude > threshold:
-            if start_time is None:
-                print("Sound detected, starting recording...")
-                start_time = time.time()  # Start the recording timer
-            
-            silence_time = None  
-            frames.append(data)
-
-            if time.time() - start_time >= duration:
-                print(f"Recording stopped after {duration} seconds.")
-                break
-        else:
-            if start_time is not None:
-                frames.append(data)
-                if silence_time is None:
-                    silence_time = time.time()  # Start tracking silence time
-            
-            if silence_time is not None and time.time() - silence_time >= max_silence_duration:
-                print(f"Silence detected for {max_silence_duration} seconds, stopping recording...")
-                break
+# audio is a float32 array at 16 kHz, or a file path
+def transcribe_with_malaya(audio):
+    # Load audio file when given a path
+    if isinstance(audio, str):
+        audio, sr = malaya_speech.load(audio)
+    # Perform greedy decoding with the STT model that stays loaded
+    transcription_text = malaya_asr.transcribe(audio)
+    print(f"Transcribed Text: {transcription_text} (real-time factor {malaya_asr.stats()['real_time_factor']:.2f})")
+    return transcription_text
 
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    if frames:
-        wf = wave.open(file_path, 'wb')
-        wf.setnchannels(1)
-        wf.setsampwidth(p.get_sample_size(pyaudio.paInt16))
-        wf.setframerate(sample_rate)
-        wf.writeframes(b''.join(frames))
-        wf.close()
-        print(f"Audio saved to {file_path}")
-    else:
+# Function to record one utterance, ended by voice activity detection (see vad.py)
+# Returns float32 samples at sample_rate for the transcriber, nothing is written to disk unless debug_path is set
+def record_audio(sample_rate=16000, debug_path=None):
+    print("Listening for speech...")
+    utterance = listen(endpointer, sample_rate)
+    if utterance is None:
         print("No audio recorded.")
+        return None
+
+    # Save the recorded audio to a .wav file for debugging
+    if debug_path:
+        save_wav(debug_path, utterance, sample_rate)
+        print(f"Audio saved to {debug_path}")
+    return to_float32(utterance)
 
 # Function to send response text to the Flask server 
 def send_response_to_flask(response_text):
@@ -110,6 +86,19 @@ def send_response_to_flask(response_text):
 
 # Main function
 if __name__ == "__main__":
+    startup = StartupTimer(SCRIPT_START)
+    parser = argparse.ArgumentParser(description="Talk to NAO in Malay with malaya-speech")
+    parser.add_argument('--warmup', action='store_true',
+                        help="load the Malaya STT model in a background thread at startup instead of on first use")
+    parser.add_argument('--quantized', action='store_true',
+                        help="use the quantized Malaya STT model (smaller and faster on CPU, slightly less accurate)")
+    parser.add_argument('--debug-recording', nargs='?', const="recorded_audio.wav", default=None,
+                        help="also save each utterance to this WAV file (default recorded_audio.wav)")
+    args = parser.parse_args()
+    malaya_asr = MalayaASR(quantized=args.quantized)
+    if args.warmup:
+        malaya_asr.warmup()
+
     conversation_history = []
     system_message = {
         'role': 'system',
@@ -117,11 +106,11 @@ if __name__ == "__main__":
     }
     conversation_history.append(system_message)
 
+    startup.ready("malaytts")
     while True:
         # Step 1: Record and transcribe speech
-        audio_file_path = "recorded_audio.wav"  # Path where the recorded audio will be saved
-        record_audio(audio_file_path)  # Record audio and save it to a file
-        recognized_text = transcribe_with_malaya(audio_file_path)  # Transcribe using Malaya
+        audio = record_audio(debug_path=args.debug_recording)  # Record audio into memory
+        recognized_text = transcribe_with_malaya(audio) if audio is not None else ""  # Transcribe using Malaya
         if recognized_text:
             conversation_history.append({'role': 'user', 'content': recognized_text})
             # Step 2: Send the conversation history to Ollama
@@ -0,0 +1,100 @@
+"""
+This module is used to encode concurrent SBERT queries together in one forward pass.
+
+Queries that arrive within max_wait_ms of the first waiting query (up to max_batch_size of
+them) are collected by a background thread, encoded with a single sbert_model.encode call,
+and each caller gets its own embedding back through a Future. Histograms of the batch sizes
+and of the time queries spent waiting for their batch are kept for the /stats route.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Histogram:
+    """Counts of values per bucket, bucket i holds values <= bounds[i] (the last one the rest)."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def stats(self):
+        with self.lock:
+            labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+            return {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class MicroBatchEncoder:
+    """Drop-in for sbert_model.encode that batches single-query calls from many threads."""
+
+    def __init__(self, sbert_model, max_batch_size=16, max_wait_ms=5):
+        self.sbert_model = sbert_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_delays_ms = Histogram([1, 2, 5, 10, 20, 50, 100])
+        self.worker = threading.Thread(target=self.run, name="sbert-micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, text):
+        """Queue one text for encoding, returns a Future of its embedding."""
+        future = Future()
+        self.requests.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, sentences, **kwargs):
+        # Lists (e.g. the dataset) are already batched, only single queries go through the queue
+        if isinstance(sentences, str) and not kwargs:
+            return self.submit(sentences).result()
+        return self.sbert_model.encode(sentences, **kwargs)
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            start_time = time.perf_counter()
+            self.batch_sizes.record(len(batch))
+            for _, _, queued_at in batch:
+                self.queue_delays_ms.record((start_time - queued_at) * 1000)
+            try:
+                embeddings = self.sbert_model.encode([text for text, _, _ in batch], batch_size=len(batch))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batch_size': self.batch_sizes.stats(),
+            'queue_delay_ms': self.queue_delays_ms.stats()
+        }
@@ -0,0 +1,319 @@
+"""
+This script is used to load the models shared by the nao scripts once, in a single local process.
+
+Start it (in venv3) before the other scripts:
+    python model_service.py --sbert all-MiniLM-L6-v2 --emotion michellejieli/emotion_text_classifier --whisper medium.en
+
+It serves embed / classify / transcribe calls over a local socket (127.0.0.1 with an auth key).
+pc_sr.py, RAG3.0.py and whispertts.py get their models through get_sbert_model,
+get_emotion_model and get_whisper_model: when the service is running they use it and skip
+loading the model themselves, otherwise they fall back to loading the model locally. If the
+service stops while a script is running, the script reconnects once and otherwise loads the
+model locally.
+
+Requests are unpickled, so the auth key must stay secret: it is read from NAO_MODEL_SERVICE_KEY,
+or else from a key file only the user can read (~/.nao_model_service_key, or the path in
+NAO_MODEL_SERVICE_KEY_FILE), which the service creates on its first start. The service does not
+start without a key, and scripts that find no key do not use the service.
+"""
+
+import argparse
+import os
+import secrets
+import stat
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+SERVICE_ADDRESS = ('127.0.0.1', int(os.environ.get("NAO_MODEL_SERVICE_PORT", 6001)))
+SERVICE_KEY_FILE = os.environ.get("NAO_MODEL_SERVICE_KEY_FILE",
+                                  os.path.join(os.path.expanduser("~"), ".nao_model_service_key"))
+
+# Errors of a connection that is refused, rejected or lost
+SERVICE_ERRORS = (AuthenticationError, EOFError, OSError)
+
+
+# Function to get the auth key of the service, None when there is none (create=True makes a key file)
+def load_authkey(key_file=SERVICE_KEY_FILE, create=False):
+    if os.environ.get("NAO_MODEL_SERVICE_KEY"):
+        return os.environ["NAO_MODEL_SERVICE_KEY"].encode()
+    if not os.path.exists(key_file):
+        if not create:
+            return None
+        # Created with user-only permissions, never readable by other users
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        print(f"Created the model service key file {key_file}")
+    if os.name == 'posix' and os.stat(key_file).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(f"{key_file} can be read by other users, run: chmod 600 {key_file}")
+    with open(key_file) as f:
+        return f.read().strip().encode() or None
+
+
+# Same fields as faster_whisper's segments, so remote transcription is a drop-in
+Segment = namedtuple("Segment", ["start", "end", "text"])
+
+
+class ModelService:
+    """Holds the loaded models and answers requests from the client connections."""
+
+    def __init__(self, sbert_model_name=None, emotion_model_name=None, whisper_model_size=None,
+                 whisper_device="cuda", whisper_compute_type="float16"):
+        self.models = {}
+        start_time = time.perf_counter()
+        if sbert_model_name:
+            from sentence_transformers import SentenceTransformer
+            self.models[('sbert', sbert_model_name)] = SentenceTransformer(sbert_model_name)
+        if emotion_model_name:
+            from transformers import pipeline
+            self.models[('emotion', emotion_model_name)] = pipeline("text-classification", model=emotion_model_name)
+        if whisper_model_size:
+            from faster_whisper import WhisperModel
+            self.models[('whisper', whisper_model_size)] = WhisperModel(
+                whisper_model_size, device=whisper_device, compute_type=whisper_compute_type)
+        print(f"Loaded {', '.join(name for _, name in self.models)} in {time.perf_counter() - start_time:.1f}s")
+
+    def model(self, kind, name):
+        if (kind, name) not in self.models:
+            raise KeyError(f"{kind} model '{name}' is not loaded by the model service")
+        return self.models[(kind, name)]
+
+    def handle(self, method, args, kwargs):
+        if method == 'has_model':
+            return args in self.models
+        if method == 'embed':
+            name, sentences = args
+            return self.model('sbert', name).encode(sentences, **kwargs)
+        if method == 'classify':
+            name, text = args
+            return self.model('emotion', name)(text, **kwargs)
+        if method == 'transcribe':
+            name, audio = args
+            segments, info = self.model('whisper', name).transcribe(audio, **kwargs)
+            return [Segment(s.start, s.end, s.text) for s in segments], {'language': info.language,
+                                                                         'duration': info.duration}
+        raise ValueError(f"Unknown method '{method}'")
+
+    def serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    connection.send(('ok', self.handle(method, args, kwargs)))
+                except Exception as e:
+                    connection.send(('error', f"{type(e).__name__}: {e}"))
+
+    def serve_forever(self, authkey, address=SERVICE_ADDRESS):
+        if not authkey:
+            raise ValueError("The model service needs an auth key")
+        with Listener(address, authkey=authkey) as listener:
+            print(f"Model service listening on {address[0]}:{address[1]}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"Rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+
+class ServiceClient:
+    """One connection to the model service, shared by the threads of a script."""
+
+    def __init__(self, authkey, address=SERVICE_ADDRESS):
+        self.connection = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+
+    def call(self, method, *args, **kwargs):
+        with self.lock:
+            self.connection.send((method, args, kwargs))
+            status, result = self.connection.recv()
+        if status == 'error':
+            raise RuntimeError(f"Model service: {result}")
+        return result
+
+    def close(self):
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# Function to connect to the model service once; None when it is not running or there is no key
+def service_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                authkey = load_authkey()
+            except OSError as e:
+                print(f"Not using the model service: {e}")
+                return None
+            if authkey is None:
+                return None
+            try:
+                _client = ServiceClient(authkey)
+            except AuthenticationError:
+                print("The model service rejected the auth key, loading the models locally")
+                return None
+            except (EOFError, OSError):
+                return None
+        return _client
+
+
+# Function to forget a broken connection, so the next service_client() call reconnects
+def drop_service_client(client):
+    global _client
+    with _client_lock:
+        if _client is client:
+            _client = None
+    client.close()
+
+
+class RemoteModel:
+    """A model computed by the model service, loaded locally when the service is lost."""
+
+    kind = None
+
+    def __init__(self, client, model_name, load_local):
+        self.client = client
+        self.model_name = model_name
+        self.load_local = load_local
+        self.local = None
+        self.lock = threading.Lock()
+
+    def reconnect(self):
+        drop_service_client(self.client)
+        client = service_client()
+        try:
+            if client is not None and client.call('has_model', self.kind, self.model_name):
+                self.client = client
+                return True
+        except SERVICE_ERRORS:
+            drop_service_client(client)
+        return False
+
+    def use_local(self):
+        with self.lock:
+            if self.local is None:
+                print(f"Model service lost, loading {self.model_name} locally")
+                self.local = self.load_local()
+
+    def call(self, method, local_call, *args, **kwargs):
+        for attempt in range(2):
+            if self.local is not None:
+                break
+            try:
+                return self.client.call(method, self.model_name, *args, **kwargs)
+            except SERVICE_ERRORS as e:
+                print(f"Model service call failed ({type(e).__name__}: {e})")
+                # Reconnect once (the service may have been restarted), otherwise run locally
+                if attempt or not self.reconnect():
+                    self.use_local()
+        return local_call(self.local)
+
+
+class RemoteSentenceTransformer(RemoteModel):
+    """Same encode() as SentenceTransformer, computed by the model service."""
+
+    kind = 'sbert'
+
+    def encode(self, sentences, **kwargs):
+        return self.call('embed', lambda model: model.encode(sentences, **kwargs), sentences, **kwargs)
+
+
+class RemoteEmotionClassifier(RemoteModel):
+    """Same call as a transformers text-classification pipeline, computed by the model service."""
+
+    kind = 'emotion'
+
+    def __call__(self, text, **kwargs):
+        return self.call('classify', lambda model: model(text, **kwargs), text, **kwargs)
+
+
+class RemoteWhisperModel(RemoteModel):
+    """Same transcribe() as faster_whisper.WhisperModel (segments are returned as a list)."""
+
+    kind = 'whisper'
+
+    def transcribe(self, audio, **kwargs):
+        return self.call('transcribe', lambda model: model.transcribe(audio, **kwargs), audio, **kwargs)
+
+
+# Function to get a remote model when the service has it loaded, otherwise None
+def remote_model(remote_class, name, load_local):
+    client = service_client()
+    if client is None:
+        return None
+    try:
+        if not client.call('has_model', remote_class.kind, name):
+            return None
+    except SERVICE_ERRORS:
+        drop_service_client(client)
+        return None
+    print(f"Using {name} from the model service")
+    return remote_class(client, name, load_local)
+
+
+# Functions to load the shared models in this process
+def load_sbert_model(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def load_emotion_model(model_name):
+    from transformers import pipeline
+    return pipeline("text-classification", model=model_name)
+
+
+def load_whisper_model(model_size, device="cuda", compute_type="float16"):
+    from faster_whisper import WhisperModel
+    return WhisperModel(model_size, device=device, compute_type=compute_type)
+
+
+# Functions to get the shared models, loading them locally if the service is not running
+def get_sbert_model(model_name):
+    load_local = lambda: load_sbert_model(model_name)
+    return remote_model(RemoteSentenceTransformer, model_name, load_local) or load_local()
+
+
+def get_emotion_model(model_name):
+    load_local = lambda: load_emotion_model(model_name)
+    return remote_model(RemoteEmotionClassifier, model_name, load_local) or load_local()
+
+
+def get_whisper_model(model_size, device="cuda", compute_type="float16"):
+    load_local = lambda: load_whisper_model(model_size, device, compute_type)
+    return remote_model(RemoteWhisperModel, model_size, load_local) or load_local()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the shared models once and serve them over a local socket")
+    parser.add_argument("--sbert", default="all-MiniLM-L6-v2", help="SBERT model name (empty to skip)")
+    parser.add_argument("--emotion", default="michellejieli/emotion_text_classifier",
+                        help="emotion classifier model name (empty to skip)")
+    parser.add_argument("--whisper", default="", help="faster-whisper model size, e.g. medium.en (empty to skip)")
+    parser.add_argument("--whisper-device", default="cuda")
+    parser.add_argument("--whisper-compute-type", default="float16")
+    args = parser.parse_args()
+
+    # Checked before loading the models, so a missing or unsafe key fails fast
+    try:
+        authkey = load_authkey(create=True)
+    except OSError as e:
+        raise SystemExit(f"Model service not started: {e}")
+    if authkey is None:
+        raise SystemExit(f"Model service not started: {SERVICE_KEY_FILE} is empty")
+
+    service = ModelService(args.sbert, args.emotion, args.whisper, args.whisper_device, args.whisper_compute_type)
+    service.serve_forever(authkey)
@@ -27,6 +27,10 @@ tts.setLanguage("English")
 # Define body language mode (full, disabled, or random)
 configuration = {"bodyLanguageMode": "contextual"}
 
+# Raw audio streamed to /stream_audio is 16-bit stereo PCM (4 bytes per frame)
+STREAM_FRAME_BYTES = 4
+STREAM_CHUNK_FRAMES = 4096  # ALAudioDevice takes at most 16384 frames per buffer
+
 # Play audio from Flask
 @app.route("/mp3", methods=['POST'])
 def play_mp3():
@@ -65,6 +69,36 @@ def play_mp3():
         print("Error in play_mp3: %s" % str(e))
         return "An error occurred: %s" % str(e), 500
 
+# Play raw PCM streamed in chunks, each chunk is played as soon as it arrives (nothing is saved to disk)
+@app.route("/stream_audio", methods=['POST'])
+def stream_audio():
+    try:
+        sample_rate = int(request.headers.get("X-Sample-Rate", 22050))
+        audio.setParameter("outputSampleRate", sample_rate)
+        chunk_bytes = STREAM_CHUNK_FRAMES * STREAM_FRAME_BYTES
+        pending = b""
+        frames_played = 0
+        while True:
+            data = request.stream.read(chunk_bytes)
+            if not data:
+                break
+            pending += data
+            # Only whole frames are sent, the rest waits for the next chunk
+            playable = len(pending) - len(pending) % STREAM_FRAME_BYTES
+            if playable >= chunk_bytes:
+                audio.sendRemoteBufferToOutput(playable // STREAM_FRAME_BYTES, pending[:playable])
+                frames_played += playable // STREAM_FRAME_BYTES
+                pending = pending[playable:]
+        playable = len(pending) - len(pending) % STREAM_FRAME_BYTES
+        if playable:
+            audio.sendRemoteBufferToOutput(playable // STREAM_FRAME_BYTES, pending[:playable])
+            frames_played += playable // STREAM_FRAME_BYTES
+        return jsonify(success=True, frames=frames_played,
+                       seconds=float(frames_played) / sample_rate)
+    except Exception as e:
+        print("Error in stream_audio: %s" % str(e))
+        return jsonify(success=False, error=str(e)), 500
+
 # Talk to the NAO robot
 @app.route("/talk", methods=["POST"])
 def talk():
@@ -98,6 +132,14 @@ def run_behavior():
     else:
         return jsonify({"status": "error", "message": "No behavior name provided."}), 400
 
+# List the behaviors installed on NAO, used to validate the mapping files
+@app.route("/behaviors", methods=['GET'])
+def installed_behaviors():
+    session = qi.Session()
+    session.connect("tcp://{}:{}".format(nao_ip, nao_port))
+    behavior_manager = session.service("ALBehaviorManager")
+    return jsonify({"behaviors": list(behavior_manager.getInstalledBehaviors())}), 200
+
 # Play audio from NAO's directory
 @app.route('/play_audio')
 def play_audio():
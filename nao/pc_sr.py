@@ -7,96 +7,162 @@ and able to respond to both English and Malay.
 venv3 is the virtual environment for this script.
 """
 
+import time
+SCRIPT_START = time.perf_counter()
+
+import argparse
 import speech_recognition as sr
-from gtts import gTTS
 import os
 import ollama
-from pydub import AudioSegment
-from pydub.playback import play
 import requests
-import paramiko
 import threading
-from transformers import pipeline
-import time
+import io
+import json
+import uuid
+from model_service import get_sbert_model
+from emotion import EmotionClassifier, load_emotion_pipeline, EMOTION_MODEL_NAME
+from lazy_loading import lazy_import, LazyModel, StartupTimer, warmup
+from behavior_mapping import MappingRegistry
+from embedding_store import EmbeddingStore
+from sftp_pool import SFTPPool
+from audio_stream import play_on_nao
+from language_recognition import DualLanguageRecognizer, GoogleRecognizer
+from language_id import LanguageRouter
+from tts_pipeline import TTSPipeline, TTSCache, SpeechInterrupted, create_tts_backend
+from retrieval import get_retrieval_engine
+from query_cache import QueryEmbeddingCache
+from response_cache import context_cache_key
+from sentence_stream import split_sentences, send_sentences
+from context_window import ContextWindow, ollama_summarizer, format_turn
+from embeddings import embed_sbert_batched, embed_ollama_batched, EMBED_BATCH_SIZE, OLLAMA_MAX_CONCURRENCY, QueryEmbedder
 
 # Update with your NAO's IP, username, and password
 your_nao_ip = "your_nao_ip"
 your_nao_username = "your_nao_username"
 your_nao_password = "your_nao_password"
 
-# Emotion model
-emotion_model = pipeline("text-classification", model="michellejieli/emotion_text_classifier")
+# Recognizes each utterance in Malay and English in parallel (swap the backend for a local recognizer)
+speech_backend = GoogleRecognizer()
+dual_recognizer = DualLanguageRecognizer(speech_backend)
+
+# Identify the language from one recognition, the other language is only recognized when needed
+# (set to False to always recognize Malay and English in parallel)
+FAST_LANGUAGE_ID = True
+language_router = LanguageRouter(speech_backend, min_confidence=0.8)
+
+# Heavy libraries are imported on first use, so the script is ready to listen sooner
+gtts = lazy_import("gtts")
+startup = StartupTimer(SCRIPT_START)
+
+# Speak English replies sentence by sentence while the LLM is still generating
+STREAM_RESPONSES = True
+
+# Stream Malay speech to NAO from memory (nao_talk.py /stream_audio) instead of mp3 + SFTP + /play_audio
+STREAM_AUDIO = True
+
+# Malay TTS backend: 'gtts' (online) or 'pyttsx3' (offline, needs a Malay voice installed)
+TTS_BACKEND = 'gtts'
+malay_tts_backend = create_tts_backend(TTS_BACKEND, lang='ms')
+tts_cache = TTSCache()  # Clips of repeated phrases (greetings, confirmations) are synthesized once
+
+# Emotion model backend: 'pipeline' (transformers), or 'onnx' / 'int8' for a quantized CPU model
+EMOTION_BACKEND = 'pipeline'
+# Emotion model (loaded on first use, or in the background with --warmup)
+emotion_model = LazyModel("emotion classifier", lambda: load_emotion_pipeline(EMOTION_MODEL_NAME, EMOTION_BACKEND))
+# Classifies replies in the background while they are sent to NAO, and caches the labels
+emotion_classifier = EmotionClassifier(emotion_model)
 
 # Initialize SBERT model for embedding
-sbert_model = SentenceTransformer('all-MiniLM-L6-v2')  # Lightweight SBERT model; can change as needed
+SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'  # Lightweight SBERT model; can change as needed
+# Shared with the other scripts when model_service.py runs; loaded on first use, or in the background with --warmup
+sbert_model = LazyModel("SBERT", lambda: get_sbert_model(SBERT_MODEL_NAME))
+
+# Vector index used for retrieval: 'brute' (exact), or 'ivf' / 'hnsw' (approximate) for large datasets
+INDEX_BACKEND = 'brute'
+
+# Cache of query embeddings (LRU, entries expire after one day, saved to disk on exit in a file of its own)
+query_embedding_cache = QueryEmbeddingCache(max_entries=1024, ttl=24 * 3600, persist_path="pc_sr_query_embedding_cache.json")
+query_embedder = QueryEmbedder(sbert_model, SBERT_MODEL_NAME, cache=query_embedding_cache)
+
+# Optional semantic answer cache for near-duplicate questions, disabled by default
+# (enable with response_cache.SemanticResponseCache(threshold=0.92, max_entries=256, ttl=3600))
+response_cache = None
+
+# Define Nao's personality and conversation template
+template = """
+You are Nao, a friendly chatbot from Universiti Brunei Darussalam.Keep your answer in one or two sentences.
+Here is the conversation history: {context}
+
+Question: {question}
+
+Answer:
+"""
+
+# Define the context directory to store chat history
+CONTEXT_DIR = "contexts"
+if not os.path.exists(CONTEXT_DIR):
+    os.makedirs(CONTEXT_DIR)
+
+# Token budget for the conversation history in the prompt, older turns are folded into a rolling summary
+context_window = ContextWindow(max_tokens=768, summarize_fn=ollama_summarizer('llama3.2'))
 
 
 # Load and preprocess dataset using SBERT and Ollama for embeddings (only instructions)
-def load_and_preprocess_data(dataset_path, model_name='llama3.2'):
+# Embeddings are cached on disk, so only new or changed instructions are embedded on restart,
+# and those are embedded in batches (batch_size texts per SBERT pass / Ollama request)
+def load_and_preprocess_data(dataset_path, model_name='llama3.2', batch_size=EMBED_BATCH_SIZE,
+                             max_concurrency=OLLAMA_MAX_CONCURRENCY):
     with open(dataset_path) as f:
         data = json.load(f)
+    instructions = [item["instruction"] for item in data]
 
-    preprocessed_data = []
-    for item in data:
-        instruction = item["instruction"]
-        output = item["output"]
-        
-        # Use SBERT for embedding
-        sbert_embedding = sbert_model.encode(instruction)
+    # Use SBERT for embedding
+    sbert_store = EmbeddingStore(SBERT_MODEL_NAME, dataset_path=dataset_path)
+    sbert_embeddings = sbert_store.embed(
+        instructions,
+        lambda texts: embed_sbert_batched(sbert_model, texts, batch_size=batch_size)
+    )
 
-        # Optionally use Ollama for embedding as well
-        embedding_response = ollama.embed(model=model_name, input=instruction)
-        ollama_embedding = embedding_response.get('embeddings', [None])[0]
+    # Optionally use Ollama for embedding as well
+    ollama_store = EmbeddingStore(model_name, dataset_path=dataset_path)
+    ollama_embeddings = ollama_store.embed(
+        instructions,
+        lambda texts: embed_ollama_batched(texts, model_name=model_name, batch_size=batch_size,
+                                           max_concurrency=max_concurrency)
+    )
 
+    preprocessed_data = []
+    for item, sbert_embedding, ollama_embedding in zip(data, sbert_embeddings, ollama_embeddings):
         preprocessed_data.append({
-            'instruction': instruction,
-            'output': output,
+            'instruction': item["instruction"],
+            'output': item["output"],
             'sbert_embedding': sbert_embedding,
             'ollama_embedding': ollama_embedding
         })
-    return preprocessed_data
 
+    # Cached answers may be based on the old dataset
+    if response_cache is not None:
+        response_cache.invalidate()
+    return preprocessed_data
 
 
-# Function to compute combined similarity
-def combined_similarity(query_embedding, data_embedding, ollama_weight=0.5, sbert_weight=0.5):
-    sbert_similarity = cosine_similarity([query_embedding['sbert']], [data_embedding['sbert']])[0][0]
-    ollama_similarity = cosine_similarity([query_embedding['ollama']], [data_embedding['ollama']])[0][0] if data_embedding['ollama'] is not None else 0
-    return ollama_weight * ollama_similarity + sbert_weight * sbert_similarity
 
-# Embed query using both SBERT and Ollama
+# Embed query using both SBERT and Ollama, running the two models concurrently
+# Repeated questions are served from the query embedding cache without running either model
 def embed_query(query, ollama_model_name='llama3.2'):
-    sbert_query_embedding = sbert_model.encode(query)
-    ollama_query_embedding = ollama.embed(model=ollama_model_name, input=query).get('embeddings', [None])[0]
-    return {
-        'sbert': sbert_query_embedding,
-        'ollama': ollama_query_embedding
-    }
+    return query_embedder.embed(query, ollama_model_name)
 
-# Retrieve top K documents using SBERT and Ollama integration
-def retrieve_top_k(query, preprocessed_data, model_name='llama3.2', k=3):
-    query_embedding = embed_query(query, ollama_model_name=model_name)
-    similarities = [
-        combined_similarity(query_embedding, {
-            'sbert': item['sbert_embedding'],
-            'ollama': item['ollama_embedding']
-        }) for item in preprocessed_data
-    ]
-    
-    top_k_indices = np.argsort(similarities)[-k:]
-    top_k_documents = [preprocessed_data[i] for i in top_k_indices]
-
-    # Optional re-ranking step
-    re_ranked_documents = sorted(
-        top_k_documents,
-        key=lambda doc: combined_similarity(query_embedding, {
-            'sbert': doc['sbert_embedding'],
-            'ollama': doc['ollama_embedding']
-        }),
-        reverse=True
-    )
+# Start embedding a query in the background (e.g. while the transcript is still being handled)
+# Returns a Future; a later embed_query call for the same query waits for it instead of re-embedding
+def start_embed_query(query, ollama_model_name='llama3.2'):
+    return query_embedder.submit(query, ollama_model_name)
 
-    return re_ranked_documents, max(similarities)
+# Retrieve top K documents using SBERT and Ollama integration
+# The engine scores all documents at once with the combined (0.5 SBERT + 0.5 Ollama) cosine similarity
+def retrieve_top_k(query, preprocessed_data, model_name='llama3.2', k=3, query_embedding=None):
+    if query_embedding is None:
+        query_embedding = embed_query(query, ollama_model_name=model_name)
+    return get_retrieval_engine(preprocessed_data, index_backend=INDEX_BACKEND).top_k(query_embedding, k=k)
 
 
 
@@ -119,6 +185,26 @@ def generate_response(query, top_k_documents, context):
     )
     return response['message']['content']
 
+# Streaming version of generate_response, yields the response tokens as Ollama generates them
+def generate_response_stream(query, top_k_documents, context):
+    doc_context = " ".join([
+        " ".join([str(part) for part in doc['output']]) if isinstance(doc['output'], list) else str(doc['output'])
+        for doc in top_k_documents[:3]
+    ])
+    combined_context = context + "\n" + doc_context
+    prompt = template.format(context=combined_context, question=query)
+
+    stream = ollama.chat(
+        model='llama3.2',
+        messages=[
+            {'role': 'system', 'content': 'You are Nao, a friendly chatbot from Universiti Brunei Darussalam.'},
+            {'role': 'user', 'content': prompt}
+        ],
+        stream=True,
+    )
+    for chunk in stream:
+        yield chunk['message']['content']
+
 
 # Load and save context from/to files
 def load_context(file_path):
@@ -131,106 +217,98 @@ def save_context(context, file_path):
     with open(file_path, "w") as file:
         file.write(context)
 
+# Append one turn to the context file instead of rewriting the whole file
+def append_context(user_message, nao_message, file_path):
+    with open(file_path, "a") as file:
+        file.write(format_turn(user_message, nao_message))
+
 # Dynamically generate a new context file
 def new_context_file():
     return f"{CONTEXT_DIR}/{str(uuid.uuid4())}.txt"
 
 # Main Dynamic RAG function
+# Near-duplicate questions grounded on the same documents and conversation reuse the cached answer
 def dynamic_rag(query, preprocessed_data, context, model_name='llama3.2', top_k=3):
-    top_k_documents, max_similarity = retrieve_top_k(query, preprocessed_data, model_name=model_name, k=top_k)
+    query_embedding = embed_query(query, ollama_model_name=model_name)
+    top_k_documents, max_similarity = retrieve_top_k(query, preprocessed_data, model_name=model_name, k=top_k,
+                                                     query_embedding=query_embedding)
+
+    context_key = context_cache_key(top_k_documents, context)
+    if response_cache is not None:
+        cached_response = response_cache.get(query_embedding['sbert'], context_key)
+        if cached_response is not None:
+            return cached_response
+
     response = generate_response(query, top_k_documents, context)
+    if response_cache is not None:
+        response_cache.put(query_embedding['sbert'], context_key, response)
     return response
 
+# Streaming version of dynamic_rag, yields the response sentence by sentence as soon as each is complete
+def dynamic_rag_stream(query, preprocessed_data, context, model_name='llama3.2', top_k=3):
+    query_embedding = embed_query(query, ollama_model_name=model_name)
+    top_k_documents, max_similarity = retrieve_top_k(query, preprocessed_data, model_name=model_name, k=top_k,
+                                                     query_embedding=query_embedding)
+
+    context_key = context_cache_key(top_k_documents, context)
+    if response_cache is not None:
+        cached_response = response_cache.get(query_embedding['sbert'], context_key)
+        if cached_response is not None:
+            yield from split_sentences([cached_response])
+            return
+
+    sentences = []
+    for sentence in split_sentences(generate_response_stream(query, top_k_documents, context)):
+        sentence = clean_text(sentence)
+        if sentence:
+            sentences.append(sentence)
+            yield sentence
+    if response_cache is not None:
+        response_cache.put(query_embedding['sbert'], context_key, " ".join(sentences))
+
 
 # Function to record audio
 def record_audio():
     recognizer = sr.Recognizer()
     
-    english_markers = {
-    'hello', 'hi', 'hey', 'how', 'are', 'you', 'what', 'when', 'where', 'why', 'who', 
-    'the', 'is', 'am', 'are', 'this', 'that', 'it', 'we', 'they', 'do', 'does', 'did', 
-    'can', 'could', 'would', 'will', 'shall', 'should', 'your', 'my', 'mine', 'their', 
-    'our', 'and', 'or', 'with', 'for', 'about', 'from', 'at', 'of', 'in', 'on', 'up', 
-    'down', 'yes', 'no', 'please', 'thank', 'thanks', 'okay', 'really', 'know', 'think', 
-    'believe', 'understand', 'like', 'want', 'need', 'good', 'bad', 'happy', 'sad', 
-    'love', 'hate'
-    }
-
-    malay_markers = {
-    'apa', 'bila', 'siapa', 'mengapa', 'bagaimana', 'saya', 'awak', 'anda', 'dia', 
-    'mereka', 'ini', 'itu', 'dan', 'atau', 'dengan', 'kerana', 'sebab', 'jika', 'kalau', 
-    'tak', 'tidak', 'boleh', 'hendak', 'mahu', 'suka', 'cinta', 'baik', 'buruk', 
-    'gembira', 'sedih', 'betul', 'salah', 'tahu', 'faham', 'kenal', 'ingat', 'percaya', 
-    'kami', 'kita', 'korang', 'kami', 'punya', 'jangan', 'kenapa', 'macam', 'sudah', 
-    'belum', 'nanti', 'lah', 'kah', 'lah', 'ke', 'ya', 'tidak'
-    }
-
-    
     with sr.Microphone() as source:
         print("Please speak something:")
         recognizer.adjust_for_ambient_noise(source)
         audio = recognizer.listen(source)
 
-        try:
-            try:
-                malay_text = recognizer.recognize_google(audio, language='ms')
-            except:
-                malay_text = None
-
-            try:
-                english_text = recognizer.recognize_google(audio, language='en-US')
-            except:
-                english_text = None
-
-            # If we got both translations, use word markers to help determine language
-            if malay_text and english_text:
-                english_count = sum(1 for word in english_text.lower().split() if word in english_markers)
-                malay_count = sum(1 for word in malay_text.lower().split() if word in malay_markers)
-                
-                # If we found marker words, use them to determine language
-                if english_count > 0 or malay_count > 0:
-                    return {'text': english_text, 'is_malay': False} if english_count >= malay_count else {'text': malay_text, 'is_malay': True}
-                
-                # Fallback to word count if no markers found
-                malay_words = len(malay_text.split())
-                english_words = len(english_text.split())
-                return {'text': english_text, 'is_malay': False} if english_words > malay_words else {'text': malay_text, 'is_malay': True}
-            
-            # If only one language was recognized, use that
-            elif malay_text:
-                return {'text': malay_text, 'is_malay': True}
-            elif english_text:
-                return {'text': english_text, 'is_malay': False}
-            else:
-                raise sr.UnknownValueError()
-            
-        except sr.UnknownValueError:
-            print("Sorry, I could not understand the audio.")
-            return None
-        except sr.RequestError as e:
-            print(f"Could not request results from Google Speech Recognition service; {e}")
-            return None
+    try:
+        # One recognition plus language ID (language_id.py), or Malay and English at the same time
+        if FAST_LANGUAGE_ID:
+            result = language_router.recognize(audio)
+            if result is not None:
+                print(f"Language confidence: {result['confidence']:.2f}")
+        else:
+            result = dual_recognizer.recognize(audio)
+        if result is None:
+            raise sr.UnknownValueError()
+        return result
+
+    except sr.UnknownValueError:
+        print("Sorry, I could not understand the audio.")
+        return None
+    except sr.RequestError as e:
+        print(f"Could not request results from Google Speech Recognition service; {e}")
+        return None
 
 # Function to save response text as mp3 file
 def save_mp3(response_text):
-    tts = gTTS(text=response_text, lang='ms')  # Use 'ms' for Malay
+    tts = gtts.gTTS(text=response_text, lang='ms')  # Use 'ms' for Malay
     tts.save("response.mp3")  # Save the audio file
 
-# Function to play response text as mp3 file for testing purpose
-def respond_with_gtts(response_text):
-    # Convert the response text to speech
-    tts = gTTS(text=response_text, lang='ms')  # Use 'ms' for Malay
-    tts.save("response.mp3")  # Save the audio file
+# Function to play an audio clip on this computer
+def play_locally(audio_bytes, format):
+    from pydub import AudioSegment
+    from pydub.playback import play
+    play(AudioSegment.from_file(io.BytesIO(audio_bytes), format=format))
 
-    # Check if the file was created
-    if os.path.exists("response.mp3"):
-        # print("MP3 file created successfully.")
-        # Load and play the audio file
-        audio = AudioSegment.from_mp3("response.mp3")
-        play(audio)  # Play the audio file
-        os.remove("response.mp3")  # Remove the audio file after playing
-    else:
-        print("Error: response.mp3 was not created.")
+# Function to play response text for testing purpose, sentence by sentence while the next one is synthesized
+def respond_with_gtts(response_text):
+    TTSPipeline(malay_tts_backend, play_locally, cache=tts_cache).speak(response_text)
 
 # Function to send response text to the Flask server
 def send_response_to_flask(response_text):
@@ -245,53 +323,37 @@ def send_response_to_flask(response_text):
     except Exception as e:
         print(f"An error occurred while sending response to Flask server: {e}")
 
-# Load behavior mapping from the text file
-def load_behavior_mapping(file_path):
-    behavior_mapping = {}
-    with open(file_path, 'r') as file:
-        for line in file:
-            behavior, keywords = line.strip().split(':')
-            behavior_mapping[behavior] = keywords.split(',')
-    return behavior_mapping
-
-# Load behavior mapping from the text file
-behavior_mapping = load_behavior_mapping("command_mapping.txt")
-emotion_mapping = load_behavior_mapping("emotion_mapping.txt")
+# Behavior keywords and emotion actions, parsed once and reloaded when the mapping files change
+mapping_registry = MappingRegistry("command_mapping.txt", "emotion_mapping.txt")
 
 # Function to find the behavior to run based on the transcribed text
 def find_behavior(text):
-    for behavior, keywords in behavior_mapping.items():
-        if any(keyword in text.lower() for keyword in keywords):
-            return behavior
-    return None
+    return mapping_registry.find_behavior(text)
 
 # Function to find the behavior to run based on the emotion word
 def find_emotion_action(emotion_word):
-    # Load emotion mappings from file
-    with open('emotion_mapping.txt', 'r') as f:
-        emotion_mappings = dict(line.strip().split(': ') for line in f if line.strip())
-    
-    # Reverse the mapping since we want to look up by emotion name
-    reversed_mappings = {v: k for k, v in emotion_mappings.items()}
-    
-    # Look up the animation path for the given emotion word
-    return reversed_mappings.get(emotion_word.lower())
+    return mapping_registry.find_emotion_action(emotion_word)
+
+# SFTP sessions to NAO, kept open between uploads (one pool per robot and user)
+sftp_pools = {}
+
+# Function to get the SFTP pool of a robot, created on first use
+def get_sftp_pool(nao_ip, nao_port, nao_username, nao_password):
+    key = (nao_ip, nao_port, nao_username)
+    if key not in sftp_pools:
+        sftp_pools[key] = SFTPPool(nao_ip, nao_port, nao_username, nao_password)
+    return sftp_pools[key]
 
 # Function to upload file to NAO    
 def upload_file_to_nao(local_file_path, nao_ip, nao_port, nao_username, nao_password):
-    # Connect to the NAO robot
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(nao_ip, port=nao_port, username=nao_username, password=nao_password)
+    pool = get_sftp_pool(nao_ip, nao_port, nao_username, nao_password)
 
-    # Use SCP to upload the file
-    sftp = ssh.open_sftp()
+    # Use SFTP to upload the file over the already open session
     remote_file_path = '/home/nao/recordings/' + local_file_path.split('/')[-1]
-    sftp.put(local_file_path, remote_file_path)
-    sftp.close()
-    ssh.close()
-
-    print(f"File uploaded to {remote_file_path}")
+    upload_seconds = pool.upload(local_file_path, remote_file_path)
+    stats = pool.stats()
+    print(f"File uploaded to {remote_file_path} in {upload_seconds * 1000:.0f} ms "
+          f"({stats['uploads']} uploads, {stats['reconnects']} reconnects)")
 
 # Function to send a request to the Flask server to run a behavior
 def run_behavior(behavior_name):
@@ -312,11 +374,23 @@ def clean_text(text):
     text = text.replace("<|start_header_id|>", "").replace("<|end_header_id|>", "")
     return text.strip()
 
+# Function to run the emotion behavior once the emotion label of the reply is ready
+def run_emotion_behavior(emotion_future):
+    emotion_label = emotion_future.result()
+    print("English emotion label: ", emotion_label)
+    emotion_action = find_emotion_action(emotion_label)
+    print("English emotion action: ", emotion_action)
+    run_behavior(emotion_action)
+
 # Function to execute actions in parallel
 def execute_actions(response_text, behavior_name):
+    run_alongside_response(response_text, run_behavior, behavior_name)
+
+# Function to send the response to NAO while behavior_target(behavior_arg) runs on a parallel thread
+def run_alongside_response(response_text, behavior_target, behavior_arg):
     # Create two threads for parallel execution
     response_thread = threading.Thread(target=send_response_to_flask, args=(response_text,))
-    behavior_thread = threading.Thread(target=run_behavior, args=(behavior_name,))
+    behavior_thread = threading.Thread(target=behavior_target, args=(behavior_arg,))
     
     # Start both threads
     response_thread.start()
@@ -326,6 +400,28 @@ def execute_actions(response_text, behavior_name):
     response_thread.join()
     behavior_thread.join()
 
+# Malay replies are synthesized sentence by sentence and streamed to NAO
+malay_tts = TTSPipeline(malay_tts_backend, play_on_nao, cache=tts_cache)
+
+# Function to speak Malay text on NAO, streamed from memory or through the mp3 file upload
+# The mp3 is only used when nothing was streamed, so part of a reply is never said twice
+def speak_malay_on_nao(response_text):
+    if STREAM_AUDIO:
+        try:
+            # Sentence N+1 is synthesized while sentence N plays
+            first_audio = malay_tts.speak(response_text)
+            if first_audio is not None:
+                print(f"Malay reply started playing on NAO after {first_audio:.2f}s")
+            return
+        except SpeechInterrupted as e:
+            if e.played:
+                print(f"Streaming to NAO stopped, the rest of the reply is not played: {e}")
+                return
+            print(f"Could not stream audio to NAO, uploading the mp3 instead: {e}")
+    save_mp3(response_text)
+    upload_file_to_nao('response.mp3', your_nao_ip, 22, your_nao_username, your_nao_password)
+    play_audio_on_nao()
+
 # Function to play audio on NAO
 def play_audio_on_nao():
     try:
@@ -340,8 +436,20 @@ def play_audio_on_nao():
 
 # Main function
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Talk to NAO in English and Malay")
+    parser.add_argument('--warmup', action='store_true',
+                        help="load the models in background threads at startup instead of on first use")
+    args = parser.parse_args()
+    if args.warmup:
+        warmup(sbert_model, emotion_model)
+
     dataset_path = "your dataset.json path"  # Replace with your dataset path
     preprocessed_data = load_and_preprocess_data(dataset_path, model_name='llama3.2')  # Initialize preprocessed data for RAG
+    startup.mark("dataset loaded")
+    mapping_registry.load()  # Warns about mapped behaviors that are not installed on NAO
+    if not STREAM_AUDIO:
+        # Open the SFTP session now, so the first Malay reply does not wait for the SSH handshake
+        get_sftp_pool(your_nao_ip, 22, your_nao_username, your_nao_password).warmup()
     conversation_history = []
     system_message = {
         'role': 'system',
@@ -349,10 +457,12 @@ if __name__ == "__main__":
     }
     conversation_history.append(system_message)
     current_context_file = new_context_file()
+    context_turns = []  # (user, nao) turns of this conversation, the prompt only gets a bounded window of them
 
     # Define greeting words
     greeting_words = ['hello', 'hi', 'hey', 'greetings', 'good morning', 'good afternoon', 'good evening']
 
+    startup.ready("pc_sr")
     while True:
         result = record_audio()
         if result:
@@ -360,8 +470,12 @@ if __name__ == "__main__":
             print("Transcribed text: ", recognized_text)
             is_malay = result['is_malay']
             print("Is Malay: ", is_malay)
-            
-            context = load_context(current_context_file)
+
+            # Start embedding the query now, it runs while the context is loaded and behaviors are matched
+            start_embed_query(recognized_text)
+
+            context = context_window.build(context_turns, key=current_context_file)
+            print("Context tokens saved so far: ", context_window.stats()['saved_tokens'])
 
             # Add language indicator to the user message
             language_prefix = "[MALAY]" if is_malay else "[ENGLISH]"
@@ -379,26 +493,24 @@ if __name__ == "__main__":
                 # )
                 
                 response_text = ""
-                response_text = rag_generate_response(recognized_text, context)
+                response_text = dynamic_rag(recognized_text, preprocessed_data, context, model_name='llama3.2', top_k=3)
                 # for chunk in stream:
                 #     response_text += chunk['message']['content']
                 #     print(chunk['message']['content'], end='', flush=True)
 
                 cleaned_response_text = clean_text(response_text)
 
-                emotion_response = emotion_model(cleaned_response_text)[0]
-                emotion_label_malay = emotion_response['label']
-                print("Malay emotion label: ", emotion_label_malay)
+                # Classified in the background while the speech is made and uploaded
+                emotion_future_malay = emotion_classifier.submit(cleaned_response_text)
 
                 # Append Ollama's response to the conversation history
                 conversation_history.append({'role': 'assistant', 'content': cleaned_response_text})
-                context += f"\nUser: {recognized_text}\nNao: {response_text}"
-                save_context(context, current_context_file)
+                context_turns.append((recognized_text, response_text))
+                append_context(recognized_text, response_text, current_context_file)
 
-                # For Malay text, use TTS + upload + play approach
-                save_mp3(cleaned_response_text)
-                upload_file_to_nao('response.mp3', your_nao_ip, 22, your_nao_username, your_nao_password)
-                play_audio_on_nao()
+                # For Malay text, use TTS and play it on NAO
+                speak_malay_on_nao(cleaned_response_text)
+                print("Malay emotion label: ", emotion_future_malay.result())
             
             else: #english     
                 if recognized_text:
@@ -435,30 +547,44 @@ if __name__ == "__main__":
                     #     messages=conversation_history,
                     #     stream=True,
                     # )
-                    response_text = ""
-                    response_text = rag_generate_response(recognized_text, context)
-                    # for chunk in stream:
-                    #     response_text += chunk['message']['content']
-                    #     print(chunk['message']['content'], end='', flush=True)
-
-                    cleaned_response_text = clean_text(response_text)
-                    emotion_response = emotion_model(cleaned_response_text)[0]
-                    emotion_label = emotion_response['label']
-                    print("English emotion label: ", emotion_label)
-
-                   
-                    emotion_action = find_emotion_action(emotion_label)
-                    print("English emotion action: ", emotion_action)
-
-                    # Append Ollama's response to the conversation history
-                    conversation_history.append({'role': 'assistant', 'content': response_text})
-                    
-                    if any(word.lower() in recognized_text.lower() for word in greeting_words):
-                        print(cleaned_response_text)
-                        execute_actions(cleaned_response_text, "dialog_hello/bhr_wave")
+                    is_greeting = any(word.lower() in recognized_text.lower() for word in greeting_words)
+
+                    if STREAM_RESPONSES:
+                        # Each sentence is sent to /talk as soon as it is complete, so NAO starts
+                        # speaking after the first sentence instead of after the whole generation
+                        if is_greeting:
+                            run_behavior_thread = threading.Thread(target=run_behavior, args=("dialog_hello/bhr_wave",))
+                            run_behavior_thread.start()
+
+                        # Once the whole reply is generated, pick the emotion behavior while NAO is still speaking
+                        sentences = send_sentences(
+                            dynamic_rag_stream(recognized_text, preprocessed_data, context, model_name='llama3.2', top_k=3),
+                            send_response_to_flask,
+                            on_generated=None if is_greeting else
+                            lambda sentences: run_emotion_behavior(emotion_classifier.submit(" ".join(sentences)))
+                        )
+                        if is_greeting:
+                            run_behavior_thread.join()
+                        response_text = " ".join(sentences)
+                        print(response_text)
+                        conversation_history.append({'role': 'assistant', 'content': response_text})
                     else:
-                        # send_response_to_flask(cleaned_response_text)
-                        execute_actions(cleaned_response_text, emotion_action)
+                        response_text = ""
+                        response_text = dynamic_rag(recognized_text, preprocessed_data, context, model_name='llama3.2', top_k=3)
+
+                        cleaned_response_text = clean_text(response_text)
+
+                        # Append Ollama's response to the conversation history
+                        conversation_history.append({'role': 'assistant', 'content': response_text})
+
+                        if is_greeting:
+                            print(cleaned_response_text)
+                            execute_actions(cleaned_response_text, "dialog_hello/bhr_wave")
+                        else:
+                            # send_response_to_flask(cleaned_response_text)
+                            # NAO starts speaking while the emotion is classified on the behavior thread
+                            emotion_future = emotion_classifier.submit(cleaned_response_text)
+                            run_alongside_response(cleaned_response_text, run_emotion_behavior, emotion_future)
 
                     # Limit the conversation history size
                     if len(conversation_history) > 10:
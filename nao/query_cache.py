@@ -0,0 +1,113 @@
+"""
+This module is used to cache query embeddings, so repeated questions skip SBERT and Ollama.
+
+Entries are keyed by the normalized query text and the embedding model names, kept in LRU
+order with an optional time-to-live, and can be saved to a JSON file to survive restarts.
+"""
+
+import atexit
+import base64
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# Function to normalize a query so that "What is SDS?" and "what is  SDS" share one entry
+def normalize_query(query):
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.rstrip("?!. ")
+
+
+# Functions to store float32 vectors compactly in JSON
+def encode_vector(vector):
+    if vector is None:
+        return None
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(text):
+    if text is None:
+        return None
+    return np.frombuffer(base64.b64decode(text), dtype=np.float32)
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU/TTL cache of query embeddings with hit/miss counters."""
+
+    def __init__(self, max_entries=1024, ttl=None, persist_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds an entry stays valid, None keeps it until evicted
+        self.persist_path = persist_path
+        self.entries = OrderedDict()  # key -> (time added, {name: vector})
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, query, model_name):
+        return f"{model_name}|{normalize_query(query)}"
+
+    def get(self, query, model_name):
+        """Return the cached embeddings of the query, or None on a miss."""
+        key = self.key(query, model_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query, model_name, embeddings):
+        key = self.key(query, model_name)
+        with self.lock:
+            self.entries[key] = (time.time(), embeddings)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def save(self):
+        """Write the cache to persist_path (atomically, through a temporary file)."""
+        if not self.persist_path:
+            return
+        with self.lock:
+            data = [
+                [key, added, {name: encode_vector(vector) for name, vector in embeddings.items()}]
+                for key, (added, embeddings) in self.entries.items()
+            ]
+        with open(self.persist_path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(self.persist_path + ".tmp", self.persist_path)
+
+    def load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path) as f:
+                data = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Could not load query cache {self.persist_path}: {e}")
+            return
+        now = time.time()
+        for key, added, embeddings in data[-self.max_entries:]:
+            if self.ttl is None or now - added <= self.ttl:
+                self.entries[key] = (added, {name: decode_vector(vector) for name, vector in embeddings.items()})
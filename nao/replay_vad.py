@@ -0,0 +1,125 @@
+"""
+This script is used to replay WAV fixtures through the endpointer and measure its endpoint latency.
+
+For every utterance found it prints when the speech started and ended and when the endpoint
+fired; the endpoint latency is the time from the end of speech to the endpoint (the dead time
+before transcription can start). The same fixtures are run through the old fixed rule of
+record_audio (mean amplitude > 500, stop after 2 s of silence or 5 s of recording) to compare.
+Pass --labels with "file,speech_end_seconds" lines to measure against hand-labelled speech ends.
+
+--noisy-fixture writes a synthetic WAV (quiet start, then steady noise louder than the initial
+threshold with two spoken bursts) and replays it; the noise floor printed every second shows it
+converging to the noise, and only the two bursts are found, not the noise.
+
+Example:
+    python replay_vad.py fixtures/*.wav --hangover-ms 500
+    python replay_vad.py --noisy-fixture noisy.wav
+"""
+
+import argparse
+import csv
+import os
+import time
+import numpy as np
+from vad import Endpointer, wav_frames, wav_sample_rate, save_wav, SAMPLE_RATE
+
+LEGACY_FRAME_SAMPLES = 1024
+
+
+# Function to find the endpoint the old record_audio loop would produce, in seconds (None if it never starts)
+def legacy_endpoint(path, threshold=500, duration=5, max_silence_duration=2):
+    sample_rate = wav_sample_rate(path)
+    frame_seconds = LEGACY_FRAME_SAMPLES / sample_rate
+    start_time = silence_time = None
+    now = 0.0
+    for frame in wav_frames(path, LEGACY_FRAME_SAMPLES):
+        now += frame_seconds
+        if np.abs(frame).mean() > threshold:
+            if start_time is None:
+                start_time = now
+            silence_time = None
+            if now - start_time >= duration:
+                return now
+        elif start_time is not None:
+            if silence_time is None:
+                silence_time = now
+            if now - silence_time >= max_silence_duration:
+                return now
+    return now if start_time is not None else None
+
+
+# Function to write the noisy fixture: 2 s of quiet room, then steady noise with two 1.5 s speech bursts
+def write_noisy_fixture(path, seconds=20, noise_rms=1000, speech_rms=8000, sample_rate=SAMPLE_RATE):
+    rng = np.random.default_rng(0)
+    t = np.arange(seconds * sample_rate) / sample_rate
+    samples = rng.normal(0, 50, len(t))
+    samples[t >= 2] = rng.normal(0, noise_rms, int(np.sum(t >= 2)))  # A fan starts after calibration
+    for start in (12, 16):
+        burst = (t >= start) & (t < start + 1.5)
+        # 200 Hz voice with 4 Hz syllables
+        envelope = np.abs(np.sin(2 * np.pi * 4 * t[burst]))
+        samples[burst] += speech_rms * np.sqrt(2) * envelope * np.sin(2 * np.pi * 200 * t[burst])
+    save_wav(path, np.clip(samples, -32768, 32767), sample_rate)
+
+
+# Function to replay one file through a new endpointer, returns the endpointer, the processing seconds
+# and the noise floor at the end of every second of audio
+def replay(path, **options):
+    endpointer = Endpointer(sample_rate=wav_sample_rate(path), **options)
+    frames_per_second = max(1, round(1 / endpointer.frame_seconds))
+    floors = []
+    start_time = time.perf_counter()
+    for frame in wav_frames(path):
+        endpointer.process(frame)
+        if endpointer.frames_seen % frames_per_second == 0:
+            floors.append(endpointer.noise_floor)
+    endpointer.flush()
+    return endpointer, time.perf_counter() - start_time, floors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Endpoint latency of the VAD on WAV fixtures")
+    parser.add_argument("files", nargs="*", help="16-bit WAV fixtures")
+    parser.add_argument("--noisy-fixture", help="Write the synthetic noisy fixture to this path and replay it too")
+    parser.add_argument("--labels", help="CSV of file,speech_end_seconds for the first utterance of each file")
+    parser.add_argument("--hangover-ms", type=int, default=600)
+    parser.add_argument("--pre-roll-ms", type=int, default=300)
+    parser.add_argument("--threshold-ratio", type=float, default=3.0)
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, newline='') as f:
+            labels = {os.path.basename(row[0]): float(row[1]) for row in csv.reader(f) if len(row) >= 2}
+
+    files = list(args.files)
+    if args.noisy_fixture:
+        write_noisy_fixture(args.noisy_fixture)
+        files.append(args.noisy_fixture)
+    if not files:
+        parser.error("give WAV fixtures or --noisy-fixture")
+
+    latencies, legacy_latencies = [], []
+    for path in files:
+        endpointer, seconds, floors = replay(path, hangover_ms=args.hangover_ms, pre_roll_ms=args.pre_roll_ms,
+                                             threshold_ratio=args.threshold_ratio)
+        audio_seconds = endpointer.frames_seen * endpointer.frame_seconds
+        print(f"{path}: {len(endpointer.utterances)} utterance(s), "
+              f"processed in {seconds / max(audio_seconds, 1e-9):.4f}x real time")
+        print(f"  noise floor each second: {' '.join(f'{floor:.0f}' for floor in floors)}, "
+              f"{endpointer.noise_rejections} steady noise segment(s) dropped")
+        for start, speech_end, endpoint in endpointer.utterances:
+            print(f"  speech {start:.2f}-{speech_end:.2f}s, endpoint at {endpoint:.2f}s "
+                  f"(+{(endpoint - speech_end) * 1000:.0f} ms)")
+        if not endpointer.utterances:
+            continue
+        speech_end = labels.get(os.path.basename(path), endpointer.utterances[0][1])
+        latencies.append(endpointer.utterances[0][2] - speech_end)
+        legacy = legacy_endpoint(path)
+        if legacy is not None:
+            legacy_latencies.append(legacy - speech_end)
+            print(f"  old record_audio endpoint at {legacy:.2f}s (+{(legacy - speech_end) * 1000:.0f} ms)")
+
+    if latencies:
+        print(f"Mean endpoint latency: {np.mean(latencies) * 1000:.0f} ms "
+              f"(old record_audio: {np.mean(legacy_latencies) * 1000 if legacy_latencies else float('nan'):.0f} ms)")
@@ -0,0 +1,87 @@
+"""
+This module is used to reuse answers for near-duplicate questions instead of calling ollama.chat.
+
+A cached answer is returned when the new query's SBERT embedding is within the similarity
+threshold of a cached query and the context key is the same. The context key
+(context_cache_key) is made of the retrieved documents and a hash of the conversation context,
+so paraphrases of "what is SDS" share one answer, but questions grounded on other data, and
+follow-ups or other sessions with a different conversation history, do not.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# Function to build the context key of an answer from the retrieved documents and the conversation context
+def context_cache_key(top_k_documents, context):
+    context_hash = hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+    return tuple(doc['instruction'] for doc in top_k_documents) + (context_hash,)
+
+
+class SemanticResponseCache:
+    """LRU cache of answers looked up by embedding similarity, with per-entry TTL."""
+
+    def __init__(self, threshold=0.92, max_entries=256, ttl=3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds an answer stays valid, None keeps it until evicted
+        self.entries = OrderedDict()  # id -> dict(embedding, context_key, response, time)
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def remove_expired(self):
+        if self.ttl is None:
+            return
+        now = time.time()
+        for entry_id in [i for i, e in self.entries.items() if now - e['time'] > self.ttl]:
+            del self.entries[entry_id]
+
+    def get(self, embedding, context_key):
+        """Return the cached answer of the most similar compatible query, or None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        with self.lock:
+            self.remove_expired()
+            candidates = [(i, e) for i, e in self.entries.items() if e['context_key'] == context_key]
+            if candidates:
+                similarities = np.stack([e['embedding'] for _, e in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry['response']
+            self.misses += 1
+            return None
+
+    def put(self, embedding, context_key, response):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            self.entries[self.next_id] = {
+                'embedding': embedding / max(np.linalg.norm(embedding), 1e-12),
+                'context_key': context_key,
+                'response': response,
+                'time': time.time()
+            }
+            self.next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the dataset has been reloaded."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
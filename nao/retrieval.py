@@ -0,0 +1,94 @@
+"""
+This module is used to retrieve the top K documents for a query from the preprocessed dataset.
+
+Each document is indexed once as [normalized SBERT embedding, normalized Ollama embedding],
+and the query as [sbert_weight * SBERT query, ollama_weight * Ollama query]. Their inner
+product is exactly the combined cosine similarity, so a single vector index (exact or
+approximate, see vector_index.py) scores the whole dataset instead of one
+cosine_similarity call per document.
+"""
+
+import numpy as np
+from vector_index import create_index
+
+
+# Function to normalize a vector to unit length (None, or a zero vector, gives zeros)
+def normalized_vector(embedding, dim):
+    vector = np.zeros(dim, dtype=np.float32)
+    if embedding is not None and dim > 0 and len(embedding) == dim:
+        vector[:] = embedding
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+    return vector
+
+
+class RetrievalEngine:
+    """Combined SBERT/Ollama cosine similarity search over a pluggable vector index."""
+
+    def __init__(self, preprocessed_data, ollama_weight=0.5, sbert_weight=0.5, index_backend='brute',
+                 **index_options):
+        self.documents = preprocessed_data
+        self.ollama_weight = ollama_weight
+        self.sbert_weight = sbert_weight
+        self.index_backend = index_backend
+        self.index_options = index_options
+        self.index = None
+        self.size = 0
+        self.sync()
+
+    def document_vector(self, item):
+        return np.concatenate([
+            normalized_vector(item['sbert_embedding'], self.sbert_dim),
+            normalized_vector(item['ollama_embedding'], self.ollama_dim)
+        ])
+
+    def query_vector(self, query_embedding):
+        return np.concatenate([
+            self.sbert_weight * normalized_vector(query_embedding['sbert'], self.sbert_dim),
+            self.ollama_weight * normalized_vector(query_embedding['ollama'], self.ollama_dim)
+        ])
+
+    def sync(self):
+        """Index the documents appended to the dataset since the last call."""
+        new_documents = self.documents[self.size:]
+        if not new_documents:
+            return
+        if self.index is None:
+            # Dimensions come from the first documents; if no document has an Ollama embedding
+            # yet, the Ollama part is left out of the index
+            self.sbert_dim = next((len(d['sbert_embedding']) for d in new_documents if d['sbert_embedding'] is not None), 0)
+            self.ollama_dim = next((len(d['ollama_embedding']) for d in new_documents if d['ollama_embedding'] is not None), 0)
+            self.index = create_index(self.index_backend, self.sbert_dim + self.ollama_dim, **self.index_options)
+        self.index.add(np.vstack([self.document_vector(item) for item in new_documents]))
+        self.size = len(self.documents)
+
+    def add_documents(self, items):
+        """Append new documents (e.g. freshly scraped pages) to the dataset and index them."""
+        self.documents.extend(items)
+        self.sync()
+
+    def top_k(self, query_embedding, k=3):
+        """Return (top K documents ordered by similarity, max similarity)."""
+        if self.index is None or len(self.index) == 0:
+            return [], 0.0
+        ids, scores = self.index.search(self.query_vector(query_embedding), k)
+        if len(ids) == 0:
+            # An approximate index can find no candidates, e.g. when the probed IVF lists are empty
+            return [], 0.0
+        return [self.documents[i] for i in ids], float(scores[0])
+
+
+_engine = None
+
+
+# Function to get the engine for the dataset, rebuilding it only when the dataset is replaced
+# Documents appended to the same list are indexed incrementally
+def get_retrieval_engine(preprocessed_data, index_backend='brute', **index_options):
+    global _engine
+    if _engine is None or _engine.documents is not preprocessed_data or _engine.index_backend != index_backend \
+            or _engine.size > len(preprocessed_data):
+        _engine = RetrievalEngine(preprocessed_data, index_backend=index_backend, **index_options)
+    elif _engine.size < len(preprocessed_data):
+        _engine.sync()
+    return _engine
@@ -0,0 +1,86 @@
+"""
+This module is used to turn a stream of LLM tokens into complete sentences as early as possible,
+and to send those sentences to the robot in order while the LLM is still generating.
+"""
+
+import queue
+import re
+import threading
+
+# Words ending with a dot that do not end a sentence
+ABBREVIATIONS = {'dr', 'mr', 'mrs', 'ms', 'prof', 'dept', 'st', 'no', 'vs', 'etc', 'e.g', 'i.e', 'bdr', 'sdn', 'bhd'}
+
+# A sentence ends at . ! ? (optionally followed by quotes or brackets) and whitespace, or at a newline
+SENTENCE_END = re.compile(r'([.!?]+["\')\]]*)\s+|\n+')
+
+
+class SentenceSplitter:
+    """Incremental splitter: feed() text pieces, get back the sentences completed so far."""
+
+    def __init__(self, min_length=2):
+        self.buffer = ""
+        self.min_length = min_length
+
+    def is_boundary(self, match):
+        if match.group(1) is None:
+            return True  # Newline
+        words = self.buffer[:match.start()].split()
+        last_word = words[-1].lower().rstrip('.') if words else ''
+        if match.group(1).startswith('.') and (last_word in ABBREVIATIONS or len(last_word) == 1):
+            return False  # "Dr. Ali" or an initial such as "A. Rahman"
+        return True
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if not self.is_boundary(match):
+                continue
+            sentence = self.buffer[start:match.end()].strip()
+            # Very short pieces such as "1." in a list are kept with the next sentence
+            if len(sentence) >= self.min_length and sentence.strip('.!?') != '':
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        sentence, self.buffer = self.buffer.strip(), ""
+        return [sentence] if sentence else []
+
+
+# Function to group a stream of text pieces into sentences
+def split_sentences(pieces, min_length=2):
+    splitter = SentenceSplitter(min_length=min_length)
+    for piece in pieces:
+        yield from splitter.feed(piece)
+    yield from splitter.flush()
+
+
+# Function to send sentences in order from a background thread while they are still being produced
+# on_generated(sentences) is called once every sentence is produced, while the last ones may still be sending
+# Returns the list of all sentences once the last one has been sent
+def send_sentences(sentences, send_fn, on_generated=None):
+    pending = queue.Queue()
+
+    def sender():
+        while True:
+            sentence = pending.get()
+            if sentence is None:
+                return
+            send_fn(sentence)
+
+    sender_thread = threading.Thread(target=sender, daemon=True)
+    sender_thread.start()
+    sent = []
+    try:
+        for sentence in sentences:
+            pending.put(sentence)
+            sent.append(sentence)
+        if on_generated is not None:
+            on_generated(sent)
+    finally:
+        pending.put(None)
+        sender_thread.join()
+    return sent
@@ -0,0 +1,165 @@
+"""
+This module is used to upload files to NAO over SFTP without a new SSH handshake per upload.
+
+SFTPPool keeps up to `size` SSH/SFTP sessions open to the robot, with SSH keepalives so idle
+sessions are not dropped by NAO or the network. Before a session is reused it is checked
+(transport still active, and a cheap stat() when it has been idle for a while); a dead session
+is reconnected, and an upload that fails on a broken session is retried once on a new one.
+Upload times and reconnect counts are kept for stats().
+"""
+
+import atexit
+import queue
+import threading
+import time
+from lazy_loading import lazy_import
+from timings import StageTimings
+
+paramiko = lazy_import("paramiko")
+
+
+class SFTPSession:
+    """One SSH connection with its SFTP channel, reconnected when it breaks."""
+
+    def __init__(self, host, port, username, password, keepalive=15, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.ssh = None
+        self.sftp = None
+        self.last_used = 0.0
+
+    def connect(self):
+        self.close()
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(self.host, port=self.port, username=self.username, password=self.password,
+                    timeout=self.timeout, banner_timeout=self.timeout, auth_timeout=self.timeout)
+        ssh.get_transport().set_keepalive(self.keepalive)
+        self.ssh = ssh
+        self.sftp = ssh.open_sftp()
+        self.last_used = time.monotonic()
+
+    def healthy(self, idle_check=30):
+        """True when the session can be used; sessions idle for idle_check seconds are probed."""
+        if self.ssh is None or self.sftp is None:
+            return False
+        transport = self.ssh.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        if time.monotonic() - self.last_used > idle_check:
+            try:
+                self.sftp.stat('.')
+            except Exception:
+                return False
+        return True
+
+    def put(self, local_file_path, remote_file_path):
+        self.sftp.put(local_file_path, remote_file_path)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        for resource in (self.sftp, self.ssh):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+        self.sftp = None
+        self.ssh = None
+
+
+class SFTPPool:
+    """A small pool of reusable SFTP sessions to one robot."""
+
+    def __init__(self, host, port, username, password, size=1, keepalive=15, idle_check=30):
+        self.idle_check = idle_check
+        self.sessions = queue.Queue()
+        self.all_sessions = []
+        for _ in range(size):
+            session = SFTPSession(host, port, username, password, keepalive=keepalive)
+            self.sessions.put(session)
+            self.all_sessions.append(session)
+        self.uploads = 0
+        self.failures = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.lock = threading.Lock()
+        self.timings = StageTimings()
+        atexit.register(self.close)
+
+    def checkout(self):
+        session = self.sessions.get()
+        try:
+            if not session.healthy(self.idle_check):
+                self.reconnect(session)
+        except Exception:
+            self.sessions.put(session)
+            raise
+        return session
+
+    def reconnect(self, session):
+        was_connected = session.ssh is not None
+        start_time = time.perf_counter()
+        session.connect()
+        self.timings.record('connect', time.perf_counter() - start_time)
+        with self.lock:
+            self.connects += 1
+            if was_connected:
+                self.reconnects += 1
+
+    def upload(self, local_file_path, remote_file_path):
+        """Upload a file, reconnecting and retrying once if the session turns out to be broken."""
+        start_time = time.perf_counter()
+        session = self.checkout()
+        try:
+            try:
+                session.put(local_file_path, remote_file_path)
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                if isinstance(e, FileNotFoundError):
+                    raise  # The local file is missing, a new session would not help
+                print(f"SFTP session to NAO broke ({e}), reconnecting")
+                self.reconnect(session)
+                session.put(local_file_path, remote_file_path)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            self.sessions.put(session)
+        elapsed = time.perf_counter() - start_time
+        self.timings.record('upload', elapsed)
+        with self.lock:
+            self.uploads += 1
+        return elapsed
+
+    def warmup(self):
+        """Open the sessions in a background thread, so the first upload does not pay the handshake."""
+        def connect_all():
+            for _ in self.all_sessions:
+                try:
+                    self.sessions.put(self.checkout())
+                except Exception as e:
+                    print(f"Could not connect to NAO over SFTP: {e}")
+                    return
+        thread = threading.Thread(target=connect_all, name="sftp-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self.lock:
+            counts = {
+                'uploads': self.uploads,
+                'failures': self.failures,
+                'connects': self.connects,
+                'reconnects': self.reconnects
+            }
+        counts['timings'] = self.timings.stats()
+        return counts
+
+    def close(self):
+        for session in self.all_sessions:
+            session.close()
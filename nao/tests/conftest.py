@@ -0,0 +1,5 @@
+# The nao scripts import each other by module name, so the tests run with nao/ on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
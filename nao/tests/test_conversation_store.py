@@ -0,0 +1,43 @@
+import conversation_store
+from conversation_store import SQLiteConversationStore
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def session_ids(store):
+    return {row[0] for row in store.db.execute("SELECT session_id FROM sessions")}
+
+
+def test_sqlite_store_purges_idle_sessions(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(conversation_store.time, "time", clock.time)
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"), idle_timeout=60)
+    store.append("kiosk", "hello", "hi")
+    store.append("robot", "hello", "hi")
+    assert session_ids(store) == {"kiosk", "robot"}
+
+    clock.now += 30
+    store.append("robot", "what is SDS?", "The School of Digital Science.")
+    clock.now += 61
+    # The next message, from any session, purges the sessions idle for more than idle_timeout
+    store.get_conversation("robot")
+    assert session_ids(store) == {"robot"}
+    # Their turns stay in the database
+    assert store.db.execute("SELECT COUNT(*) FROM turns").fetchone()[0] == 3
+
+
+def test_sqlite_store_keeps_active_conversation(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(conversation_store.time, "time", clock.time)
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"), idle_timeout=60)
+    store.append("robot", "hello", "hi")
+    clock.now += 59
+    assert store.get_turns("robot") == [("hello", "hi")]
+    clock.now += 61
+    assert store.get_turns("robot") == []
@@ -0,0 +1,30 @@
+import numpy as np
+from retrieval import RetrievalEngine
+
+
+class EmptyIndex:
+    """An index that has vectors but finds no candidates, like IVF probing empty lists."""
+
+    def __len__(self):
+        return 1
+
+    def search(self, query, k):
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+
+def documents():
+    return [{'instruction': 'What is SDS?', 'output': 'School of Digital Science',
+             'sbert_embedding': [1.0, 0.0], 'ollama_embedding': [0.0, 1.0]}]
+
+
+def test_top_k_returns_the_closest_document():
+    engine = RetrievalEngine(documents())
+    top_k_documents, max_similarity = engine.top_k({'sbert': [1.0, 0.0], 'ollama': [0.0, 1.0]}, k=3)
+    assert [doc['instruction'] for doc in top_k_documents] == ['What is SDS?']
+    assert max_similarity == 1.0
+
+
+def test_top_k_without_candidates_returns_nothing():
+    engine = RetrievalEngine(documents(), index_backend='ivf')
+    engine.index = EmptyIndex()
+    assert engine.top_k({'sbert': [1.0, 0.0], 'ollama': [0.0, 1.0]}, k=3) == ([], 0.0)
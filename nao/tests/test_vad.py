@@ -0,0 +1,43 @@
+import numpy as np
+from vad import Endpointer, SAMPLE_RATE, FRAME_SAMPLES
+from replay_vad import replay, write_noisy_fixture
+
+
+# Function to make speech-like audio: a 200 Hz voice whose loudness changes with every syllable
+def speech(seconds, rms=8000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    syllables = rng.uniform(0.4, 1.0, int(seconds * 4) + 1)[(t * 4).astype(int)]
+    envelope = syllables * np.abs(np.sin(2 * np.pi * 4 * t))
+    return rms * np.sqrt(2) * envelope * np.sin(2 * np.pi * 200 * t)
+
+
+# Function to run samples through an endpointer frame by frame, returns the utterance times
+def endpoint(samples, **options):
+    endpointer = Endpointer(**options)
+    samples = np.clip(samples, -32768, 32767).astype(np.int16)
+    for start in range(0, len(samples), FRAME_SAMPLES):
+        endpointer.process(samples[start:start + FRAME_SAMPLES])
+    endpointer.flush()
+    return endpointer.utterances
+
+
+def test_continuous_speech_longer_than_6s_is_one_utterance():
+    rng = np.random.default_rng(1)
+    silence = rng.normal(0, 50, SAMPLE_RATE)
+    samples = np.concatenate([silence, speech(12), silence])
+    utterances = endpoint(samples, max_utterance_s=15)
+    assert len(utterances) == 1
+    start, speech_end, _ = utterances[0]
+    assert start < 1.1 and speech_end > 12.5
+
+
+def test_noise_only_lead_in_is_not_emitted(tmp_path):
+    path = str(tmp_path / "noisy.wav")
+    write_noisy_fixture(path)
+    endpointer, _, floors = replay(path)
+    # The fan starts at 2 s, the two speech bursts at 12 s and 16 s
+    starts = [start for start, _, _ in endpointer.utterances]
+    assert len(starts) == 2
+    assert 11.5 < starts[0] < 12.1 and 15.5 < starts[1] < 16.1
+    assert 900 < floors[-1] < 1100
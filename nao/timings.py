@@ -0,0 +1,33 @@
+"""
+This module is used to keep per-stage latency statistics for the /stats endpoints and benchmarks.
+
+It has no dependencies, so the audio, recognition and TTS modules can import it without
+pulling in ollama or the models.
+"""
+
+import threading
+
+
+class StageTimings:
+    """Thread-safe per-stage latency statistics (count, last, mean and max in milliseconds)."""
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            count, total, last, worst = self.stages.get(stage, (0, 0.0, 0.0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds, seconds, max(worst, seconds))
+
+    def stats(self):
+        with self.lock:
+            return {
+                stage: {
+                    'count': count,
+                    'last_ms': last * 1000,
+                    'mean_ms': total / count * 1000,
+                    'max_ms': worst * 1000
+                }
+                for stage, (count, total, last, worst) in self.stages.items()
+            }
@@ -0,0 +1,239 @@
+"""
+This module is used to speak long replies sentence by sentence, synthesizing ahead of playback.
+
+TTSPipeline splits the reply with split_sentences and synthesizes each sentence on a background
+thread while the previous one is playing, so the first audio is ready after one sentence instead
+of after the whole reply. When synthesis or playback fails, SpeechInterrupted tells how many
+sentences were already played, so a caller only falls back to another output if none were. Synthesized clips are cached by a hash of the backend, language and
+text (in memory and in TTS_CACHE_DIR), so greetings and confirmations are synthesized once.
+
+TTS backends (TTS_BACKENDS):
+- 'gtts': Google TTS, needs internet, returns mp3.
+- 'pyttsx3': offline TTS with the voices installed on this computer, returns wav. A Malay voice
+  has to be installed and passed as voice=... for Malay replies.
+"""
+
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from sentence_stream import split_sentences
+from timings import StageTimings
+
+TTS_CACHE_DIR = "tts_cache"
+
+
+class SpeechInterrupted(Exception):
+    """Speaking failed after `played` sentences were played; the error is the __cause__."""
+
+    def __init__(self, error, played):
+        super().__init__(f"{error} (after {played} played sentence(s))")
+        self.played = played
+
+
+class GTTSBackend:
+    """Google TTS (online)."""
+
+    name = 'gtts'
+    format = 'mp3'
+
+    def __init__(self, lang='ms'):
+        self.lang = lang
+
+    def synthesize(self, text):
+        from audio_stream import gtts_to_mp3_bytes
+        return gtts_to_mp3_bytes(text, self.lang)
+
+
+class Pyttsx3Backend:
+    """Offline TTS through pyttsx3 (SAPI5, NSSpeechSynthesizer or eSpeak)."""
+
+    name = 'pyttsx3'
+    format = 'wav'
+
+    def __init__(self, lang='ms', voice=None, rate=None):
+        self.lang = lang
+        self.voice = voice
+        self.rate = rate
+        self.engine = None
+        self.lock = threading.Lock()  # The pyttsx3 engine is not thread safe
+
+    def synthesize(self, text):
+        with self.lock:
+            if self.engine is None:
+                import pyttsx3
+                self.engine = pyttsx3.init()
+                if self.voice:
+                    self.engine.setProperty('voice', self.voice)
+                if self.rate:
+                    self.engine.setProperty('rate', self.rate)
+            # pyttsx3 can only synthesize to a file
+            handle, path = tempfile.mkstemp(suffix=".wav")
+            os.close(handle)
+            try:
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+                with open(path, 'rb') as f:
+                    return f.read()
+            finally:
+                os.remove(path)
+
+
+TTS_BACKENDS = {'gtts': GTTSBackend, 'pyttsx3': Pyttsx3Backend}
+
+
+# Function to create a TTS backend by name
+def create_tts_backend(name='gtts', **options):
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', expected one of {sorted(TTS_BACKENDS)}")
+    return TTS_BACKENDS[name](**options)
+
+
+class TTSCache:
+    """Synthesized clips by text hash, in memory (LRU) and on disk."""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_entries=128):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.clips = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, backend, text):
+        text = " ".join(text.split())
+        return hashlib.sha256(f"{backend.name}|{backend.lang}|{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key, format):
+        return os.path.join(self.cache_dir, f"{key}.{format}")
+
+    def get(self, backend, text):
+        key = self.key(backend, text)
+        with self.lock:
+            audio = self.clips.get(key)
+            if audio is not None:
+                self.clips.move_to_end(key)
+                self.hits += 1
+                return audio
+        if self.cache_dir and os.path.exists(self.path(key, backend.format)):
+            with open(self.path(key, backend.format), 'rb') as f:
+                audio = f.read()
+            self.remember(key, audio)
+            with self.lock:
+                self.hits += 1
+            return audio
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, backend, text, audio):
+        key = self.key(backend, text)
+        self.remember(key, audio)
+        if self.cache_dir:
+            # Written to a temporary name first, so a crash never leaves half a clip in the cache
+            path = self.path(key, backend.format)
+            with open(path + ".tmp", 'wb') as f:
+                f.write(audio)
+            os.replace(path + ".tmp", path)
+
+    def remember(self, key, audio):
+        with self.lock:
+            self.clips[key] = audio
+            self.clips.move_to_end(key)
+            while len(self.clips) > self.max_entries:
+                self.clips.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.clips),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class TTSPipeline:
+    """Synthesizes sentence N+1 while sentence N is played by play_fn(audio_bytes, format)."""
+
+    def __init__(self, backend, play_fn, cache=None, prefetch=2):
+        self.backend = backend
+        self.play_fn = play_fn
+        self.cache = cache
+        self.prefetch = prefetch  # Sentences synthesized ahead of playback
+        self.timings = StageTimings()
+
+    def synthesize(self, sentence):
+        if self.cache is not None:
+            audio = self.cache.get(self.backend, sentence)
+            if audio is not None:
+                return audio
+        start_time = time.perf_counter()
+        audio = self.backend.synthesize(sentence)
+        self.timings.record('synthesis', time.perf_counter() - start_time)
+        if self.cache is not None:
+            self.cache.put(self.backend, sentence, audio)
+        return audio
+
+    def speak(self, text):
+        """Speak a whole reply; returns the seconds until the first sentence started playing."""
+        return self.speak_sentences(split_sentences([text]))
+
+    def speak_sentences(self, sentences):
+        """Speak sentences as they come (e.g. from an LLM stream); returns the time to first audio."""
+        start_time = time.perf_counter()
+        clips = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        # Gives up when playback has stopped, so the thread never blocks on a full queue
+        def offer(item):
+            while not stop.is_set():
+                try:
+                    clips.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def synthesizer():
+            try:
+                for sentence in sentences:
+                    if not offer(self.synthesize(sentence)):
+                        return
+            except Exception as e:
+                offer(e)
+            offer(None)
+
+        threading.Thread(target=synthesizer, name="tts-synthesizer", daemon=True).start()
+        first_audio = None
+        played = 0
+        try:
+            while True:
+                audio = clips.get()
+                if audio is None:
+                    break
+                if isinstance(audio, Exception):
+                    raise audio
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start_time
+                    self.timings.record('first_audio', first_audio)
+                self.play_fn(audio, self.backend.format)
+                played += 1
+        except Exception as e:
+            raise SpeechInterrupted(e, played) from e
+        finally:
+            stop.set()  # Stops the synthesizer if playback failed
+        return first_audio
+
+    def stats(self):
+        return {
+            'backend': self.backend.name,
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'timings': self.timings.stats()
+        }
@@ -0,0 +1,211 @@
+"""
+This module is used to cut the microphone stream into utterances as soon as the speaker stops.
+
+Endpointer takes the stream frame by frame (int16 numpy arrays) and returns each utterance as
+one int16 numpy array:
+- a frame is speech when its RMS energy is threshold_ratio times above the noise floor. The floor
+  is measured on the first calibration_ms of the stream, then moves towards the RMS of silent
+  frames outside utterances; it is frozen while an utterance is open, so long speech is not cut,
+- an utterance whose frame energy stays steady for stationary_ms (e.g. a fan that starts louder
+  than the threshold) is noise, not speech: it is dropped and its level becomes the noise floor,
+- the utterance ends after hangover_ms of silence (instead of a fixed 2 s) or at max_utterance_s,
+- pre_roll_ms of audio before the first speech frame is kept, so the first syllable is not cut,
+- blips shorter than min_speech_ms of speech (a cough, a door) are dropped.
+
+microphone_frames() reads frames from PyAudio and wav_frames() from a WAV file, so the same
+endpointer runs live and in the replay harness (replay_vad.py).
+"""
+
+import collections
+import time
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 512  # 32 ms at 16 kHz
+
+
+class Endpointer:
+    """Streaming voice activity detection with an adaptive noise floor, hangover and pre-roll."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_samples=FRAME_SAMPLES, threshold_ratio=3.0,
+                 min_threshold=150.0, initial_noise_floor=100.0, noise_adaptation=0.05, calibration_ms=500,
+                 stationary_ms=1000, stationary_variation=0.15, hangover_ms=600, pre_roll_ms=300,
+                 min_speech_ms=200, max_utterance_s=15):
+        self.sample_rate = sample_rate
+        self.frame_seconds = frame_samples / sample_rate
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold  # RMS below this is never speech, even in a silent room
+        self.noise_floor = initial_noise_floor
+        self.noise_adaptation = noise_adaptation  # Weight of each silent frame in the noise floor average
+        self.calibration_frames = round(calibration_ms / 1000 / self.frame_seconds)
+        self.calibration_rms = []
+        # Speech energy rises and falls with every syllable, noise varies less than this (std / mean)
+        self.stationary_variation = stationary_variation
+        self.stationary_rms = collections.deque(maxlen=max(2, round(stationary_ms / 1000 / self.frame_seconds)))
+        self.noise_rejections = 0
+        self.hangover_frames = max(1, round(hangover_ms / 1000 / self.frame_seconds))
+        self.pre_roll = collections.deque(maxlen=max(0, round(pre_roll_ms / 1000 / self.frame_seconds)))
+        self.min_speech_frames = max(1, round(min_speech_ms / 1000 / self.frame_seconds))
+        self.max_frames = round(max_utterance_s / self.frame_seconds)
+        self.reset()
+        self.frames_seen = 0
+        self.utterances = []  # (start, speech end, endpoint) in seconds of stream time
+
+    def reset(self):
+        self.frames = []
+        self.speech_frames = 0
+        self.silent_frames = 0
+        self.start_frame = None
+        self.last_speech_frame = None
+        self.last_rms = 0.0
+        self.stationary_rms.clear()
+
+    def threshold(self):
+        return max(self.min_threshold, self.noise_floor * self.threshold_ratio)
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2))) if len(frame) else 0.0
+        if len(self.calibration_rms) < self.calibration_frames:
+            # The start of the stream is taken as background noise, never as speech
+            self.calibration_rms.append(rms)
+            self.noise_floor = float(np.median(self.calibration_rms))
+            return False
+        self.last_rms = rms
+        speech = rms > self.threshold()
+        if not speech and self.start_frame is None:
+            # Only silence outside utterances moves the noise floor, it is frozen during speech
+            self.noise_floor += self.noise_adaptation * (rms - self.noise_floor)
+        return speech
+
+    def is_stationary(self):
+        levels = np.asarray(self.stationary_rms)
+        return (len(levels) == self.stationary_rms.maxlen
+                and levels.std() < self.stationary_variation * levels.mean())
+
+    def process(self, frame):
+        """Feed one frame; returns the utterance (int16 array) when it has just ended, else None."""
+        index = self.frames_seen
+        self.frames_seen += 1
+        speech = self.is_speech(frame)
+
+        if self.start_frame is None:
+            if not speech:
+                self.pre_roll.append(frame)
+                return None
+            self.start_frame = index - len(self.pre_roll)
+            self.frames = list(self.pre_roll)
+            self.pre_roll.clear()
+
+        self.frames.append(frame)
+        self.stationary_rms.append(self.last_rms)
+        if self.is_stationary():
+            # Steady noise louder than the threshold: learn its level and drop the "utterance"
+            self.noise_floor = float(np.mean(self.stationary_rms))
+            self.noise_rejections += 1
+            self.reset()
+            return None
+        if speech:
+            self.speech_frames += 1
+            self.silent_frames = 0
+            self.last_speech_frame = index
+        else:
+            self.silent_frames += 1
+
+        if self.silent_frames >= self.hangover_frames or len(self.frames) >= self.max_frames:
+            return self.end_utterance(index)
+        return None
+
+    def end_utterance(self, index):
+        if self.speech_frames < self.min_speech_frames:
+            self.reset()
+            return None
+        # Keep as much trailing silence as pre-roll, the rest of the hangover is dropped
+        keep = len(self.frames) - max(0, self.silent_frames - self.pre_roll.maxlen)
+        utterance = np.concatenate(self.frames[:keep])
+        self.utterances.append((self.start_frame * self.frame_seconds,
+                                (self.last_speech_frame + 1) * self.frame_seconds,
+                                (index + 1) * self.frame_seconds))
+        self.reset()
+        return utterance
+
+    def flush(self):
+        """Return the utterance in progress at the end of the stream, or None."""
+        if self.start_frame is None:
+            return None
+        return self.end_utterance(self.frames_seen - 1)
+
+
+# Function to read int16 frames from the microphone until the generator is closed
+def microphone_frames(sample_rate=SAMPLE_RATE, frame_samples=FRAME_SAMPLES):
+    import pyaudio
+    p = pyaudio.PyAudio()
+    stream = p.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True,
+                    frames_per_buffer=frame_samples)
+    try:
+        while True:
+            yield np.frombuffer(stream.read(frame_samples, exception_on_overflow=False), dtype=np.int16)
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+
+
+# Function to read int16 mono frames from a 16-bit WAV file
+def wav_frames(path, frame_samples=FRAME_SAMPLES):
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit samples")
+        channels = wf.getnchannels()
+        while True:
+            data = wf.readframes(frame_samples)
+            if not data:
+                return
+            samples = np.frombuffer(data, dtype=np.int16)
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+            yield samples
+
+
+# Function to get the sample rate of a WAV file
+def wav_sample_rate(path):
+    with wave.open(path, 'rb') as wf:
+        return wf.getframerate()
+
+
+# Function to return the first utterance of a frame stream (None if the stream ends without one)
+def next_utterance(endpointer, frames):
+    for frame in frames:
+        utterance = endpointer.process(frame)
+        if utterance is not None:
+            return utterance
+    return endpointer.flush()
+
+
+# Function to listen on the microphone until one utterance has been spoken
+def listen(endpointer=None, sample_rate=SAMPLE_RATE):
+    endpointer = endpointer or Endpointer(sample_rate=sample_rate)
+    endpointer.pre_roll.clear()  # Audio from before this call is not part of the utterance
+    frames = microphone_frames(sample_rate, FRAME_SAMPLES)
+    start_time = time.perf_counter()
+    try:
+        utterance = next_utterance(endpointer, frames)
+    finally:
+        frames.close()
+    if utterance is not None:
+        print(f"Utterance of {len(utterance) / sample_rate:.1f}s after {time.perf_counter() - start_time:.1f}s")
+    return utterance
+
+
+# Function to convert int16 samples to the float32 in [-1, 1] that Whisper and Malaya take
+def to_float32(samples):
+    return np.asarray(samples, dtype=np.float32) * (1.0 / 32768.0)
+
+
+# Function to save int16 samples as a mono 16-bit WAV file
+def save_wav(path, samples, sample_rate=SAMPLE_RATE):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
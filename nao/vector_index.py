@@ -0,0 +1,196 @@
+"""
+This module is used to search the knowledge base embeddings by inner product.
+
+All backends share the same small interface (add, search, len), so the retrieval engine can
+switch from exact search to an approximate one once the scraped pages make the dataset large:
+
+- BruteForceIndex: exact, scores every vector with one matrix-vector product.
+- IVFIndex: inverted file index (k-means lists), only the nprobe closest lists are scored.
+  Higher nprobe gives better recall and higher latency.
+- HNSWIndex: graph index from hnswlib (optional dependency), tuned with ef.
+"""
+
+import numpy as np
+
+
+class GrowingMatrix:
+    """Row-appendable float32 matrix with capacity doubling, so inserts are amortized O(1)."""
+
+    def __init__(self, dim, capacity=1024):
+        self.data = np.zeros((capacity, dim), dtype=np.float32)
+        self.size = 0
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.data.shape[1])
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            grown = np.zeros((max(needed, 2 * len(self.data)), self.data.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = rows
+        self.size = needed
+
+    def view(self):
+        return self.data[:self.size]
+
+
+# Function to pick the k best scores, returns (ids, scores) in descending order
+def top_k_scores(scores, k, ids=None):
+    if len(scores) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+    k = min(k, len(scores))
+    best = np.argpartition(scores, -k)[-k:]
+    best = best[np.argsort(scores[best])[::-1]]
+    return (best if ids is None else ids[best]), scores[best]
+
+
+class BruteForceIndex:
+    """Exact inner-product search over all vectors."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.vectors = GrowingMatrix(dim)
+
+    def __len__(self):
+        return self.vectors.size
+
+    def add(self, vectors):
+        self.vectors.append(vectors)
+
+    def search(self, query, k):
+        return top_k_scores(self.vectors.view() @ np.asarray(query, dtype=np.float32), k)
+
+
+class IVFIndex:
+    """
+    Approximate inner-product search with an inverted file of n_lists k-means clusters.
+
+    Until train_size vectors have been added the index searches exactly; then it trains the
+    centroids once and assigns every vector, old and new, to its closest list.
+    """
+
+    def __init__(self, dim, n_lists=256, nprobe=8, train_size=None, iterations=10, seed=0):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_size = train_size or 8 * n_lists
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.vectors = GrowingMatrix(dim)
+        self.centroids = None
+        self.lists = []
+        self.list_arrays = None
+
+    def __len__(self):
+        return self.vectors.size
+
+    def train(self, sample):
+        """Spherical k-means on the sample, centroids are kept unit length for inner product."""
+        centroids = sample[self.rng.choice(len(sample), self.n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self.assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=self.n_lists) == 0
+            # Re-seed empty clusters with random sample vectors
+            sums[empty] = sample[self.rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [[] for _ in range(self.n_lists)]
+        self.add_to_lists(0, self.vectors.view())
+
+    def assign(self, vectors, centroids=None, chunk_size=4096):
+        centroids = self.centroids if centroids is None else centroids
+        # Chunked so the score matrix stays small for large inserts
+        return np.concatenate([
+            np.argmax(vectors[i:i + chunk_size] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), chunk_size)
+        ]) if len(vectors) else np.array([], dtype=np.int64)
+
+    def add_to_lists(self, first_id, vectors):
+        for offset, list_id in enumerate(self.assign(vectors)):
+            self.lists[list_id].append(first_id + offset)
+        self.list_arrays = None
+
+    def add(self, vectors):
+        first_id = self.vectors.size
+        self.vectors.append(vectors)
+        if self.centroids is not None:
+            self.add_to_lists(first_id, self.vectors.view()[first_id:])
+        elif self.vectors.size >= max(self.train_size, self.n_lists):
+            sample_ids = self.rng.choice(self.vectors.size, min(self.vectors.size, self.train_size), replace=False)
+            self.train(self.vectors.view()[sample_ids])
+
+    def search(self, query, k):
+        query = np.asarray(query, dtype=np.float32)
+        vectors = self.vectors.view()
+        if self.centroids is None:
+            return top_k_scores(vectors @ query, k)
+        if self.list_arrays is None:
+            self.list_arrays = [np.array(ids, dtype=np.int64) for ids in self.lists]
+        nprobe = min(self.nprobe, self.n_lists)
+        probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        candidates = np.concatenate([self.list_arrays[i] for i in probe])
+        return top_k_scores(vectors[candidates] @ query, k, ids=candidates)
+
+
+class HNSWIndex:
+    """Approximate inner-product search with an hnswlib graph; higher ef gives better recall."""
+
+    def __init__(self, dim, M=16, ef_construction=200, ef=64, capacity=1024):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("HNSWIndex needs hnswlib, install it with: pip install hnswlib")
+        self.dim = dim
+        self.index = hnswlib.Index(space='ip', dim=dim)
+        self.index.init_index(max_elements=capacity, ef_construction=ef_construction, M=M)
+        self.ef = ef
+
+    @property
+    def ef(self):
+        return self._ef
+
+    @ef.setter
+    def ef(self, value):
+        self._ef = value
+        self.index.set_ef(value)
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        count = len(self)
+        if count + len(vectors) > self.index.get_max_elements():
+            self.index.resize_index(max(count + len(vectors), 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, np.arange(count, count + len(vectors)))
+
+    def search(self, query, k):
+        k = min(k, len(self))
+        if k == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        # ef must be at least k for hnswlib to return k results
+        if self.ef < k:
+            self.index.set_ef(k)
+        labels, distances = self.index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        if self.ef < k:
+            self.index.set_ef(self.ef)
+        # hnswlib 'ip' distance is 1 - inner product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+
+INDEX_BACKENDS = {
+    'brute': BruteForceIndex,
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex,
+}
+
+
+# Function to create an index by backend name, extra keyword arguments go to the backend
+def create_index(backend, dim, **kwargs):
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}', choose from {', '.join(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend](dim, **kwargs)
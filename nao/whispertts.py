@@ -1,16 +1,24 @@
-from faster_whisper import WhisperModel
+import time
+SCRIPT_START = time.perf_counter()
+
+import argparse
+from model_service import get_whisper_model
+from lazy_loading import LazyModel, StartupTimer
 import ollama
 import requests
 import pyaudio
 import wave
 import os
-import time
-import numpy as np
+from vad import Endpointer, listen, save_wav, to_float32
  
 # Initialize the Whisper model
 model_size = "medium.en"
-whisper_model = WhisperModel(model_size, device="cuda", compute_type="float16")  # You can choose different sizes: tiny, base, small, medium, large
+# Loaded on first use, or in the background with --warmup
+whisper_model = LazyModel("Whisper", lambda: get_whisper_model(model_size, device="cuda", compute_type="float16"))  # You can choose different sizes: tiny, base, small, medium, large
  
+# Ends each utterance 0.6 s after the speaker stops; the noise floor carries over between turns
+endpointer = Endpointer(sample_rate=16000, hangover_ms=600, pre_roll_ms=300, max_utterance_s=15)
+
 # Function to play audio using PyAudio
 def play_audio(file_path):
     # Open the audio file
@@ -39,8 +47,9 @@ def play_audio(file_path):
 
  
 # Function to transcribe the recorded audio using faster-whisper
-def transcribe_with_whisper(audio_file):
-    segments, info = whisper_model.transcribe(audio_file, beam_size=5)
+# audio is a float32 array at 16 kHz (a file path also works)
+def transcribe_with_whisper(audio):
+    segments, info = whisper_model.transcribe(audio, beam_size=5)
     transcription = ""
     for segments in segments:
         transcription += segments.text + " "
@@ -50,64 +59,21 @@ def transcribe_with_whisper(audio_file):
     print("")
     return transcription.strip()
 
-def record_audio(file_path, threshold=500, sample_rate=16000, duration=5):
-    p = pyaudio.PyAudio()
-    stream = p.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=1024)
-    frames = []
+# Function to record one utterance, ended by voice activity detection (see vad.py)
+# Returns float32 samples at sample_rate for the transcriber, nothing is written to disk unless debug_path is set
+def record_audio(sample_rate=16000, debug_path=None):
     print("")
-    print("Listening for audio above the threshold...")
-
-    start_time = None  # To track when the actual recording starts
-    silence_time = None  # To track when silence begins
-    max_silence_duration = 2  # Maximum allowable silence duration
-    
-    while True:
-        data = stream.read(1024)
-        # Convert the byte data to a numpy array to analyze its amplitude
-        audio_data = np.frombuffer(data, dtype=np.int16)
-        amplitude = np.abs(audio_data).mean()  # Calculate the mean amplitude
-        
-        if amplitude > threshold:
-            if start_time is None:
-                print("Sound detected, starting recording...")
-                start_time = time.time()  # Start the recording timer
-            
-            # Reset silence tracking when sound is detected
-            silence_time = None  
-            frames.append(data)
-
-            # Stop recording after the specified duration
-            if time.time() - start_time >= duration:
-                print(f"Recording stopped after {duration} seconds.")
-                break
-        else:
-            if start_time is not None:
-                frames.append(data)  # Continue appending frames even during brief silence
-                
-                if silence_time is None:
-                    silence_time = time.time()  # Start tracking silence time
-            
-            # Stop recording if amplitude is below threshold for more than 2 seconds
-            if silence_time is not None and time.time() - silence_time >= max_silence_duration:
-                print(f"Silence detected for {max_silence_duration} seconds, stopping recording...")
-                break
-
-    # Stop and close the stream
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    # Save the recorded audio to a .wav file if recording occurred
-    if frames:
-        wf = wave.open(file_path, 'wb')
-        wf.setnchannels(1)
-        wf.setsampwidth(p.get_sample_size(pyaudio.paInt16))
-        wf.setframerate(sample_rate)
-        wf.writeframes(b''.join(frames))
-        wf.close()
-        print(f"Audio saved to {file_path}")
-    else:
+    print("Listening for speech...")
+    utterance = listen(endpointer, sample_rate)
+    if utterance is None:
         print("No audio recorded.")
+        return None
+
+    # Save the recorded audio to a .wav file for debugging
+    if debug_path:
+        save_wav(debug_path, utterance, sample_rate)
+        print(f"Audio saved to {debug_path}")
+    return to_float32(utterance)
 
 
 # Function to send response text to the Flask server
@@ -124,6 +90,16 @@ def send_response_to_flask(response_text):
         print(f"An error occurred while sending response to Flask server: {e}")
  
 if __name__ == "__main__":
+    startup = StartupTimer(SCRIPT_START)
+    parser = argparse.ArgumentParser(description="Talk to NAO in English with faster-whisper")
+    parser.add_argument('--warmup', action='store_true',
+                        help="load the Whisper model in a background thread at startup instead of on first use")
+    parser.add_argument('--debug-recording', nargs='?', const="recorded_audio.wav", default=None,
+                        help="also save each utterance to this WAV file (default recorded_audio.wav)")
+    args = parser.parse_args()
+    if args.warmup:
+        whisper_model.warmup()
+
     conversation_history = []
     system_message = {
         'role': 'system',
@@ -139,11 +115,11 @@ if __name__ == "__main__":
     #print(initial_response)  # Print the initial response to simulate the introduction
     #send_response_to_flask(initial_response)
 
+    startup.ready("whispertts")
     while True:
         # Step 1: Record and transcribe speech
-        audio_file_path = "recorded_audio.wav"  # Path where the recorded audio will be saved
-        record_audio(audio_file_path)  # Record audio and save it to a file
-        recognized_text = transcribe_with_whisper(audio_file_path)  # Transcribe the recorded audio using Whisper'
+        audio = record_audio(debug_path=args.debug_recording)  # Record audio into memory
+        recognized_text = transcribe_with_whisper(audio) if audio is not None else ""  # Transcribe the recorded audio using Whisper
         if recognized_text:
             conversation_history.append({'role': 'user', 'content': recognized_text})
             # Step 2: Send the conversation history to Ollama